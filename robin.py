@@ -19,11 +19,21 @@ import json
 import time
 import locale
 import os
-import subprocess
 import signal
 import io
+import fcntl
+import statistics
 from datetime import datetime, timezone
 
+from robin_ledger import Ledger, quiet_requested
+import robin_bars
+import robin_quotebus
+import robin_pairs
+import robin_dispatch
+import robin_orders
+import robin_daemon
+import robin_trace
+
 locale.setlocale(locale.LC_ALL, '')
 
 def printable(obj):
@@ -42,6 +52,18 @@ def write_val(name, val):
   with open(filename, 'w') as fd:
     fd.write('{}'.format(val))
 
+# Returns the new value. Read + write happen under an flock on
+# /tmp/.robin_<name>.lock so concurrent workers don't lose each other's adds.
+def add_val(name, delta):
+  with open('/tmp/.robin_{}.lock'.format(name), 'a') as lock_fd:
+    fcntl.flock(lock_fd, fcntl.LOCK_EX)
+    try:
+      val = read_val(name) + delta
+      write_val(name, val)
+      return val
+    finally:
+      fcntl.flock(lock_fd, fcntl.LOCK_UN)
+
 def read_str(name, def_str=''):
   filename = '/tmp/.robin_{}'.format(name)
   if not os.path.exists(filename):
@@ -62,7 +84,7 @@ def de_append_str(name, val):
   write_str(name, read_str(name).replace(val, ''))
 
 def get_max_price_usd(sec):
-  q = robinhood.crypto.get_crypto_historicals(sec, interval='5minute', span='day')
+  q = robin_bars.get_bars(sec, interval='5minute', span='day')
   hours = 6
   n = int((hours*60) / 5)
   q = q[-n:]
@@ -74,23 +96,77 @@ def get_max_price_usd(sec):
   return highest_price_usd
 
 
+# Average 5-minute high-low range over the last `minutes` of bars,
+# as a percent of the latest close
+def volatility_percent(q, minutes):
+  # Only use last half hour's data (last 6 items)
+  n = int(minutes / 5)
+  q = q[-n:]
+
+  avg_range_usd = 0.0
+  for x in q:
+    avg_range_usd += float(x['high_price']) - float(x['low_price'])
+  avg_range_usd /= float(n)
+
+  last_price_usd = float(q[-1]['close_price'])
+  return (avg_range_usd / last_price_usd) * 100.0
+
+# Submit a limit buy, returns (order id, quantity actually ordered)
+def place_limit_buy(sec, quantity, price, trace=None):
+  active_order_id = None
+  while not active_order_id:
+    if trace:
+      trace.submit()
+    order = robinhood.orders.order_buy_crypto_limit(
+      sec, quantity, price,
+      timeInForce='gtc',
+    )
+    if 'Order quantity has invalid increment' in printable(order):
+      if trace:
+        trace.retry('increment')
+      quantity = float(str(quantity)[:-1])
+      print('WARN: reduced quantity={}'.format(quantity))
+      time.sleep(1)
+      continue
+
+    if not ('id' in order):
+      print('order={}'.format(printable(order)))
+
+    # Contains an "id", "ref_id", 
+
+    active_order_id = order['id']
+    robin_orders.remember_order(active_order_id)
+
+  if trace:
+    trace.submitted(active_order_id, price, quantity)
+  return active_order_id, quantity
+
+# Runs on the dispatch thread: books profit into the total shared by every
+# worker, then reports the new total
+def record_profit(ledger, sec, profit_usd):
+  total_profit_usd = add_val('total_profit_usd', profit_usd)
+  print('TOTAL RUN PROFIT: {}'.format(locale.currency(total_profit_usd)))
+  ledger.record('pnl', sec, pnl=profit_usd, note='total_profit_usd={}'.format(total_profit_usd))
+  # Already on the dispatch thread, so sent now rather than queued behind
+  robin_dispatch.get_dispatcher().send_notification('{} ({})'.format(
+    locale.currency(profit_usd),
+    locale.currency(total_profit_usd)
+  ))
+
+# Filled price of an order info dict; 'price' is only the limit
+def fill_price(order_status):
+  return float(order_status.get('average_price') or order_status['price'])
+
+
 def on_exit(sig, frame):
   global active_buy_order_id
   global active_mv_sec
   
   de_append_str('actively_trading', active_mv_sec)
 
-  print('CANCELLING BUY ORDER (ctrl+c)')
-  order_state = 'unk'
-  while active_buy_order_id and order_state != 'canceled':
-    print('.', end='', flush=True)
-    order_status = robinhood.orders.cancel_crypto_order(active_buy_order_id)
-    if 'state' in order_status:
-      order_state = order_status['state'].lower().strip()
-    elif 'Order cannot be canceled at this time' in printable(order_status):
-      break;
-    else:
-      print('order_status={}'.format(printable(order_status)))
+  # Open buy + sell orders of this worker (and of dead workers), cancelled concurrently
+  print('CANCELLING BOT ORDERS (ctrl+c)')
+  robin_orders.cancel_all_bot_orders()
 
   sys.exit(0)
 
@@ -102,7 +178,9 @@ def idle_speculation():
   active_buy_order_id = ''
   active_mv_sec = 'NULL'
 
-  p = robinhood.profiles.load_account_profile()
+  ledger = Ledger(mode='live', quiet=quiet_requested())
+
+  p = robin_daemon.get_or_fetch('profile')
   cash = float(p['buying_power'])
 
   if 'ROBIN_SPEC_CASH' in os.environ:
@@ -118,6 +196,15 @@ def idle_speculation():
   if 'ROBIN_TIMEOUT_SEC' in os.environ:
     buy_order_timeout_seconds = abs(float(os.environ['ROBIN_TIMEOUT_SEC']))
 
+  # Replace a resting buy once the bid moves this far from it (0 = never,
+  # wait out buy_order_timeout_seconds instead). With repricing the timeout
+  # counts from the latest replacement.
+  reprice_percent = 0.0
+  if 'ROBIN_REPRICE_PERCENT' in os.environ:
+    reprice_percent = abs(float(os.environ['ROBIN_REPRICE_PERCENT']))
+  # Tags buy fills/cancels in the ledger, see: python robin_ledger.py fills
+  buy_mode = 'reprice' if reprice_percent > 0.0 else 'timeout'
+
   always_use_security = None
   if 'USE_SECURITY' in os.environ:
     always_use_security = os.environ['USE_SECURITY']
@@ -141,7 +228,7 @@ def idle_speculation():
 
   print('Speculating {} with {}% change'.format(locale.currency(cash), buy_sell_percent * 100.0))
 
-  total_profit_usd = read_val('total_profit_usd')
+  buy_fill_seconds = []
   active_order_id = None
   avoid_securities = []
 
@@ -149,7 +236,8 @@ def idle_speculation():
     
     now_bp = 0.0
     while True:
-      p = robinhood.profiles.load_account_profile()
+      # Shared with the other workers when robin_daemon.py is running
+      p = robin_daemon.get_or_fetch('profile', max_age=10)
       now_bp = float(p['buying_power'])
       if now_bp >= cash:
         break;
@@ -178,19 +266,9 @@ def idle_speculation():
           print('Not considering {} because it is in avoid_securities'.format(sec))
           continue
 
-        q = robinhood.crypto.get_crypto_historicals(sec, interval='5minute', span='day')
+        q = robin_bars.get_bars(sec, interval='5minute', span='day')
         # print('q={}'.format(printable(q)))
-        # Only use last half hour's data (last 6 items)
-        n = int(volatility_history_minutes / 5)
-        q = q[-n:]
-        
-        avg_range_usd = 0.0
-        for x in q:
-          avg_range_usd += float(x['high_price']) - float(x['low_price'])
-        avg_range_usd /= float(n)
-
-        last_price_usd = float(q[-1]['close_price'])
-        avg_range_percent = (avg_range_usd / last_price_usd) * 100.0
+        avg_range_percent = volatility_percent(q, volatility_history_minutes)
 
         if avg_range_percent > most_volatile[1]:
           most_volatile = (sec, avg_range_percent)
@@ -215,13 +293,13 @@ def idle_speculation():
     print('Most volatile security is {} at {}% change '.format(mv_sec, round(mv_percent_change, 1)))
     time.sleep(1)
 
-    q = robinhood.crypto.get_crypto_quote(mv_sec)
+    q = robin_quotebus.get_crypto_quote(mv_sec)
     # print('q={}'.format(printable(q)))
     current_bid_price_usd = float(q['bid_price'])
     current_ask_price_usd = float(q['ask_price'])
 
     # Bid 0.5% lower
-    my_bid_price_usd = round(current_bid_price_usd * (1.0 - buy_sell_percent), 2)
+    my_bid_price_usd = robin_pairs.round_price(mv_sec, current_bid_price_usd * (1.0 - buy_sell_percent), 'buy')
     # Check historicals, exit if my bid price is within 4% of get_max_price_usd()
     max_sec_price = get_max_price_usd(mv_sec)
     max_bid = max_bid_percent * max_sec_price
@@ -238,50 +316,48 @@ def idle_speculation():
       continue # Main while loop
       #my_bid_price_usd = round(max_bid, 2)
 
-    my_bid_security_shares = round(cash / my_bid_price_usd, 8)
+    # Sized to the pair's quantity increment so the order is accepted first time
+    my_bid_security_shares = robin_pairs.round_quantity(mv_sec, cash / my_bid_price_usd)
+    if my_bid_security_shares <= 0.0:
+      print('Not bidding on {}, {} is below its minimum order size'.format(mv_sec, locale.currency(cash)))
+      de_append_str('actively_trading', mv_sec)
+      if always_use_security:
+        # Same security every time around, it would never fit
+        return
+      avoid_securities.append(mv_sec)
+      time.sleep(random.randint(10, 30))
+      continue # Main while loop
 
     # Place order 
     print('LIMIT BUY: {} {} shares at {}/share'.format(mv_sec, round(my_bid_security_shares, 6), locale.currency(my_bid_price_usd)))
-    while not active_order_id:
-      order = robinhood.orders.order_buy_crypto_limit(
-        mv_sec, my_bid_security_shares, my_bid_price_usd,
-        timeInForce='gtc',
-      )
-      if 'Order quantity has invalid increment' in printable(order):
-        my_bid_security_shares = float(str(my_bid_security_shares)[:-1])
-        print('WARN: reduced my_bid_security_shares={}'.format(my_bid_security_shares))
-        time.sleep(1)
-        continue
-
-      if not ('id' in order):
-        print('order={}'.format(printable(order)))
-
-      # Contains an "id", "ref_id", 
-
-      active_order_id = order['id']
+    trace = robin_trace.OrderTrace(mv_sec, 'buy', bid=current_bid_price_usd, ask=current_ask_price_usd, note=buy_mode)
+    active_order_id, my_bid_security_shares = place_limit_buy(mv_sec, my_bid_security_shares, my_bid_price_usd, trace)
 
     # Wait for order to be filled
     active_buy_order_id = active_order_id
+    ledger.record('order', mv_sec, side='buy', price=my_bid_price_usd, quantity=my_bid_security_shares, cash=cash, order_id=active_order_id)
     print('Waiting for buy order {} to be filled'.format(active_order_id), end='', flush=True)
     order_state = 'confirmed'
     order_status = None
     polled_seconds = 0
+    placed_at_seconds = 0
+    reprices = 0
     cancel_buy = False
     considered_increased_buy_because_close = False
     while order_state != 'filled' and order_state != 'canceled':
-      print('.', end='', flush=True)
-      if polled_seconds >= buy_order_timeout_seconds:
+      ledger.say('.', end='', flush=True)
+      if polled_seconds - placed_at_seconds >= buy_order_timeout_seconds:
         # If (current_bid_price_usd-my_bid_price_usd)/current_bid_price_usd
         # is less than 0.5*buy_sell_percent, go back 180 seconds and continue
-        if not considered_increased_buy_because_close:
+        if not considered_increased_buy_because_close and reprice_percent <= 0.0:
           considered_increased_buy_because_close = True
-          q = robinhood.crypto.get_crypto_quote(mv_sec)
+          q = robin_quotebus.get_crypto_quote(mv_sec)
           current_bid_price_usd = float(q['bid_price'])
           x = (current_bid_price_usd-my_bid_price_usd)/current_bid_price_usd
           if x < 0.5*buy_sell_percent:
             # is very close, go back 180 seconds
             polled_seconds -= 180
-            print('!', end='', flush=True)
+            ledger.say('!', end='', flush=True)
             continue
 
         cancel_buy = True
@@ -293,11 +369,46 @@ def idle_speculation():
       order_status = robinhood.orders.get_crypto_order_info(active_order_id)
       # print('order_status={}'.format(printable(order_status)))
       order_state = order_status['state'].lower().strip()
+      trace.state(order_state)
+
+      # Follow the bid: replace the resting order when the market moved away
+      # from it by more than reprice_percent, as long as the new bid still
+      # passes the max_bid_percent check.
+      if reprice_percent > 0.0 and order_state == 'confirmed':
+        q = robin_quotebus.get_crypto_quote(mv_sec)
+        target_bid_usd = robin_pairs.round_price(mv_sec, float(q['bid_price']) * (1.0 - buy_sell_percent), 'buy')
+        if abs(target_bid_usd - my_bid_price_usd) / my_bid_price_usd < reprice_percent:
+          continue
+        if target_bid_usd >= max_bid_percent * get_max_price_usd(mv_sec):
+          continue
+        # Sized before cancelling so a bid too high for cash leaves the order resting
+        target_shares = robin_pairs.round_quantity(mv_sec, cash / target_bid_usd)
+        if target_shares <= 0.0:
+          continue
+        if robin_orders.cancel_orders([active_order_id], 5.0)[active_order_id] != 'canceled':
+          # Filled (or still cancelling), the next poll will tell
+          continue
+        robin_orders.forget_order(active_order_id)
+        trace.finish('replaced')
+        ledger.record('cancel', mv_sec, side='buy', price=my_bid_price_usd, quantity=my_bid_security_shares,
+          order_id=active_order_id, elapsed_s=polled_seconds, note='replaced')
+
+        my_bid_price_usd = target_bid_usd
+        my_bid_security_shares = target_shares
+        trace = robin_trace.OrderTrace(mv_sec, 'buy', bid=float(q['bid_price']), ask=float(q['ask_price']),
+          note='{} {}'.format(buy_mode, reprices + 1))
+        active_order_id, my_bid_security_shares = place_limit_buy(mv_sec, my_bid_security_shares, my_bid_price_usd, trace)
+        active_buy_order_id = active_order_id
+        placed_at_seconds = polled_seconds
+        reprices += 1
+        ledger.record('order', mv_sec, side='buy', price=my_bid_price_usd, quantity=my_bid_security_shares, cash=cash,
+          order_id=active_order_id, elapsed_s=polled_seconds, note='reprice {}'.format(reprices))
+        ledger.say('~', end='', flush=True)
     print('')
 
-    if cancel_buy:
+    # Cancelled by something else (eg robin.py status) counts as a timeout too
+    if cancel_buy or order_state == 'canceled':
       print('CANCELLING BUY ORDER (timout after {} seconds)'.format(polled_seconds))
-      order_state = 'unk'
       while order_state != 'canceled':
         print('.', end='', flush=True)
         order_status = robinhood.orders.cancel_crypto_order(active_order_id)
@@ -308,28 +419,45 @@ def idle_speculation():
         else:
           print('order_status={}'.format(printable(order_status)))
 
+      ledger.record('cancel', mv_sec, side='buy', price=my_bid_price_usd, quantity=my_bid_security_shares,
+        order_id=active_order_id, elapsed_s=polled_seconds, note=buy_mode)
+      trace.finish('canceled')
+      robin_orders.forget_order(active_order_id)
+      robin_dispatch.call(ledger.flush, key='ledger')
       de_append_str('actively_trading', mv_sec)
       time.sleep(random.randint(10, 20))
       continue # Main while loop
 
     print('BUY ORDER FILLED')
+    robin_orders.forget_order(active_order_id)
+    buy_fill_seconds.append(polled_seconds)
+    print('Filled after {}s with {} reprices (median {}s over {} fills)'.format(
+      polled_seconds, reprices, statistics.median(buy_fill_seconds), len(buy_fill_seconds),
+    ))
+    ledger.record('fill', mv_sec, side='buy', price=order_status['price'], quantity=order_status['quantity'],
+      order_id=active_order_id, elapsed_s=polled_seconds, note=buy_mode)
+    trace.finish('filled', fill_price(order_status), order_status['quantity'])
     time.sleep(15)
 
     # Place limit sell at executed purchase price +0.5%
     purchase_price_usd = float(order_status['price'])
-    my_ask_price_usd = round( purchase_price_usd * (1.001 + buy_sell_percent), 2)
+    my_ask_price_usd = robin_pairs.round_price(mv_sec, purchase_price_usd * (1.001 + buy_sell_percent), 'sell')
     my_bid_security_shares = float(order_status['quantity'])
 
     print('LIMIT SELL: {} {} shares at {}/share'.format(mv_sec, round(my_bid_security_shares, 6), locale.currency(my_ask_price_usd)))
     active_order_id = None
+    q = robin_quotebus.get_crypto_quote(mv_sec)
+    trace = robin_trace.OrderTrace(mv_sec, 'sell', bid=float(q['bid_price']), ask=float(q['ask_price']), note=buy_mode)
 
     while not active_order_id:
+      trace.submit()
       order = robinhood.orders.order_sell_crypto_limit(
         mv_sec, my_bid_security_shares, my_ask_price_usd,
         timeInForce='gtc',
       )
 
       if 'Insufficient holdings.' in printable(order):
+        trace.retry('insufficient_holdings')
         print('!', end='', flush=True)
         time.sleep(5)
         continue
@@ -339,83 +467,114 @@ def idle_speculation():
         time.sleep(2)
 
         if 'Order quantity has invalid increment' in printable(order):
+          trace.retry('increment')
           my_bid_security_shares = float(str(my_bid_security_shares)[:-1])
           print('WARN: reduced my_bid_security_shares={}'.format(my_bid_security_shares))
+        else:
+          trace.retry('rejected')
 
         continue
 
       active_order_id = order['id']
+      robin_orders.remember_order(active_order_id)
+    trace.submitted(active_order_id, my_ask_price_usd, my_bid_security_shares)
 
+    ledger.record('order', mv_sec, side='sell', price=my_ask_price_usd, quantity=my_bid_security_shares, order_id=active_order_id)
     print('Waiting for sell order {} to be filled'.format(active_order_id), end='', flush=True)
     order_state = 'confirmed'
     order_status = None
+    polled_seconds = 0
     while order_state != 'filled' and order_state != 'canceled':
-      print('.', end='', flush=True)
+      ledger.say('.', end='', flush=True)
       time.sleep(poll_seconds)
+      polled_seconds += poll_seconds
 
       order_status = robinhood.orders.get_crypto_order_info(active_order_id)
       #print('order_status={}'.format(printable(order_status)))
       order_state = order_status['state'].lower().strip()
+      trace.state(order_state)
     print('')
 
+    if order_state == 'canceled':
+      # Cancelled by something else (eg robin.py status), the shares are still held
+      print('SELL ORDER CANCELED, {} {} shares left unsold'.format(round(my_bid_security_shares, 6), mv_sec))
+      robin_orders.forget_order(active_order_id)
+      ledger.record('cancel', mv_sec, side='sell', price=my_ask_price_usd, quantity=my_bid_security_shares,
+        order_id=active_order_id, elapsed_s=polled_seconds, note='external')
+      trace.finish('canceled')
+      robin_dispatch.call(ledger.flush, key='ledger')
+      de_append_str('actively_trading', mv_sec)
+      avoid_securities.append(mv_sec)
+      time.sleep(random.randint(10, 20))
+      continue # Main while loop
+
     print('SELL ORDER FILLED')
+    robin_orders.forget_order(active_order_id)
     de_append_str('actively_trading', mv_sec)
     avoid_securities.append(mv_sec)
 
     sell_price_usd = float(order_status['price'])
+    ledger.record('fill', mv_sec, side='sell', price=sell_price_usd, quantity=my_bid_security_shares,
+      order_id=active_order_id, elapsed_s=polled_seconds)
+    trace.finish(order_state, fill_price(order_status), my_bid_security_shares)
 
     # Report status
     profit_usd = (sell_price_usd - purchase_price_usd) * my_bid_security_shares
-    total_profit_usd = read_val('total_profit_usd')
-    total_profit_usd += profit_usd
     print('SALE PROFIT: {}'.format(locale.currency(profit_usd)))
-    print('TOTAL RUN PROFIT: {}'.format(locale.currency(total_profit_usd)))
-    
-    # Other bookkeeping
-    write_val('total_profit_usd', total_profit_usd)
-
-    subprocess.run([
-      '/j/bin/ding',
-      '{} ({})'.format(
-        locale.currency(profit_usd),
-        locale.currency(total_profit_usd)
-      )
-    ])
+
+    # Other bookkeeping, done on the dispatch thread so a slow disk or
+    # notifier can't hold up the next cycle.
+    robin_dispatch.call(record_profit, ledger, mv_sec, profit_usd)
+    robin_dispatch.call(ledger.flush, key='ledger')
 
     print('Sleeping...')
     time.sleep(random.randint(10, 20))
 
 
-def main(args=sys.argv):
+logged_in = False
+
+def login():
+  global logged_in
+  if logged_in:
+    return
   # Ensure generate_device_token always gives
   # the same machine name.
   # https://github.com/jmfernandes/robin_stocks/blob/master/robin_stocks/robinhood/authentication.py
   random.seed(a="123", version=2)
 
-  login = robinhood.login(
+  robinhood.login(
     'email@example.com',
     'some-pw-or-token',
   )
 
   random.seed(a=str(time.time()), version=2)
-  
+  logged_in = True
+
+def main(args=sys.argv):
+  # status + debug are answered by robin_daemon.py when it is running,
+  # without logging in or calling the API from this process
+  daemon_running = robin_daemon.query('ping') is not None
+  if not (daemon_running and ('status' in args or 'debug' in args)):
+    login()
+
   if 'debug' in args:
-    profileData = robinhood.load_portfolio_profile()
+    profileData = robin_daemon.get_or_fetch('portfolio')
     print('profileData={}'.format(printable(profileData)))
 
     #positions = robinhood.get_open_stock_positions()
     #print('positions={}'.format(printable(positions)))
 
-    cryptoProfile = robinhood.crypto.load_crypto_profile()
+    cryptoProfile = robin_daemon.get_or_fetch('crypto_profile')
     print('cryptoProfile={}'.format(printable(cryptoProfile)))
 
-    cryptoPositions = robinhood.crypto.get_crypto_positions()
+    cryptoPositions = robin_daemon.get_or_fetch('positions')
     print('cryptoPositions={}'.format(printable(cryptoPositions)))
 
-    cryptoQuote = robinhood.crypto.get_crypto_quote('LTC')
+    cryptoQuote = robin_daemon.get_crypto_quote('LTC')
     print('cryptoQuote={}'.format(printable(cryptoQuote)))
 
-    cryptoHist = robinhood.crypto.get_crypto_historicals('LTC', interval='5minute', span='day')
+    reply = robin_daemon.query('bars', sec='LTC', interval='5minute', span='day')
+    cryptoHist = reply['value'] if reply else robinhood.crypto.get_crypto_historicals('LTC', interval='5minute', span='day')
     print('cryptoHist={}'.format(printable(cryptoHist[0:10])))
     print('len(cryptoHist)={}'.format(len(cryptoHist)))
 
@@ -428,7 +587,7 @@ def main(args=sys.argv):
 
     elif 'status' in args:
 
-      profile = robinhood.profiles.load_account_profile()
+      profile = robin_daemon.get_or_fetch('profile')
       buying_power = float(profile['buying_power'])
 
       print('Buying Power: {}'.format(locale.currency(buying_power)))
@@ -437,7 +596,7 @@ def main(args=sys.argv):
 
       # We manually changed the file $(python -m site --user-site)/robin_stocks/robin_stocks.py
       # to silence this. Also see: rg 'Found Additional pages.' $(python -m site --user-site)
-      cryptoOrders = robinhood.orders.get_all_open_crypto_orders()
+      cryptoOrders = robin_daemon.get_or_fetch('orders')
       
       for order in cryptoOrders:
         #print('order={}'.format(printable(order)))
@@ -446,10 +605,9 @@ def main(args=sys.argv):
         limit_price_usd = float(order['price'])
         quantity_sec = float(order['quantity'])
         order_cost = quantity_sec*limit_price_usd
-        sec = robinhood.crypto.get_crypto_quote_from_id(order['currency_pair_id'], 'symbol')
-        sec = sec.replace('USD', '')
+        sec = order['symbol']
 
-        quote = robinhood.crypto.get_crypto_quote(sec)
+        quote = robin_daemon.get_crypto_quote(sec)
         ask_price = float(quote['ask_price'])
         bid_price = float(quote['bid_price'])
 
@@ -472,11 +630,13 @@ def main(args=sys.argv):
 
             if 'y' in yn:
               print('Cancelling order {}...'.format(order['id']))
+              login()
               robinhood.orders.cancel_crypto_order(order['id'])
+              robin_daemon.refresh('orders')
 
       print('=== crypto owned ===')
       
-      cryptoPositions = robinhood.crypto.get_crypto_positions()
+      cryptoPositions = robin_daemon.get_or_fetch('positions')
       
       for pos in cryptoPositions:
         #print('pos={}'.format(printable(pos)))
@@ -0,0 +1,222 @@
+
+# Local OHLCV bar store. Each security has exactly one feed from the API,
+# 5-minute bars, which are merged into /tmp/.robin_bars_<SEC>.pickle as they
+# arrive. Every process on the host shares that file: a refresh merges in what
+# the others saved under an flock on <file>.lock, and saves replace the file
+# atomically so it is never read half written. Coarser intervals (15minute, hour, 6hour, day) are resampled locally
+# and only the buckets touched by new 5-minute bars are recomputed.
+#
+# bars = robin_bars.get_bars('BTC', interval='hour', span='week')
+# returns dicts shaped like robinhood.crypto.get_crypto_historicals() output.
+
+# python -m pip install --user robin_stocks numpy
+from robin_stocks import robinhood
+
+import os
+import time
+import fcntl
+import pickle
+import threading
+from datetime import datetime, timezone
+
+import numpy as np
+
+INTERVAL_SECONDS = {
+  '5minute': 5*60,
+  '15minute': 15*60,
+  'hour': 60*60,
+  '6hour': 6*60*60,
+  'day': 24*60*60,
+}
+
+SPAN_SECONDS = {
+  'day': 24*60*60,
+  'week': 7*24*60*60,
+  'month': 30*24*60*60,
+  '3month': 90*24*60*60,
+  'year': 365*24*60*60,
+}
+
+COLUMNS = ['ts', 'open', 'high', 'low', 'close', 'volume']
+
+# Don't hit the API for a security more often than this
+REFRESH_SECONDS = 60
+# Drop 5-minute bars older than this from the store
+KEEP_SECONDS = 400*24*60*60
+
+def parse_ts(begins_at):
+  return int(datetime.fromisoformat(begins_at.replace('Z', '+00:00')).timestamp())
+
+def format_ts(ts):
+  return datetime.fromtimestamp(int(ts), timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+def empty_columns():
+  cols = {c: np.zeros(0) for c in COLUMNS}
+  cols['ts'] = np.zeros(0, dtype=np.int64)
+  return cols
+
+def columns_from_historicals(historicals):
+  return {
+    'ts': np.array([parse_ts(x['begins_at']) for x in historicals], dtype=np.int64),
+    'open': np.array([float(x['open_price']) for x in historicals]),
+    'high': np.array([float(x['high_price']) for x in historicals]),
+    'low': np.array([float(x['low_price']) for x in historicals]),
+    'close': np.array([float(x['close_price']) for x in historicals]),
+    'volume': np.array([float(x['volume']) for x in historicals]),
+  }
+
+# Union of two sets of bar columns, `new` wins where both have a bar
+def merge_columns(old, new):
+  keep = ~np.isin(old['ts'], new['ts'])
+  merged = {c: np.concatenate((old[c][keep], new[c])) for c in COLUMNS}
+  order = np.argsort(merged['ts'], kind='stable')
+  return {c: v[order] for c, v in merged.items()}
+
+# Aggregate bars into buckets of `width` seconds.
+# open = first open, high = max, low = min, close = last close, volume = sum.
+def resample_columns(cols, width):
+  n = len(cols['ts'])
+  if n < 1:
+    return empty_columns()
+  buckets = cols['ts'] // width
+  starts = np.flatnonzero(np.diff(buckets, prepend=buckets[0] - 1))
+  ends = np.append(starts[1:], n) - 1
+  return {
+    'ts': buckets[starts] * width,
+    'open': cols['open'][starts],
+    'high': np.maximum.reduceat(cols['high'], starts),
+    'low': np.minimum.reduceat(cols['low'], starts),
+    'close': cols['close'][ends],
+    'volume': np.add.reduceat(cols['volume'], starts),
+  }
+
+
+class BarStore:
+  def __init__(self, sec, path=None):
+    self.sec = sec
+    self.path = path or '/tmp/.robin_bars_{}.pickle'.format(sec)
+    self.fine = empty_columns()
+    self.resampled = {}
+    self.last_refresh = 0.0
+    # Held by get_bars so threads (eg robin_daemon.py clients) take turns
+    self.lock = threading.Lock()
+    loaded = self.load()
+    if loaded is not None:
+      self.fine = loaded
+
+  # Columns saved on disk, or None when there is no (readable) file
+  def load(self):
+    try:
+      with open(self.path, 'rb') as fd:
+        return pickle.load(fd)
+    except FileNotFoundError:
+      return None
+    except Exception as e:
+      print('WARN: ignoring {}: {}'.format(self.path, e))
+      return None
+
+  # Bars saved by other processes since this one last looked
+  def merge_saved(self):
+    saved = self.load()
+    if saved is None:
+      return
+    known = np.isin(saved['ts'], self.fine['ts'])
+    if not np.all(known):
+      self.fine = merge_columns(saved, self.fine)
+      self.resampled = {}
+
+  def save(self):
+    tmp = '{}.{}.tmp'.format(self.path, os.getpid())
+    with open(tmp, 'wb') as fd:
+      pickle.dump(self.fine, fd)
+    os.replace(tmp, self.path)
+
+  # Merge new 5-minute bars, newer data wins where they overlap
+  def update(self, historicals):
+    new = columns_from_historicals(historicals)
+    if len(new['ts']) < 1:
+      return
+    order = np.argsort(new['ts'], kind='stable')
+    new = {c: v[order] for c, v in new.items()}
+
+    first_new = new['ts'][0]
+    keep = np.searchsorted(self.fine['ts'], first_new)
+    self.fine = {c: np.concatenate((self.fine[c][:keep], new[c])) for c in COLUMNS}
+
+    too_old = np.searchsorted(self.fine['ts'], self.fine['ts'][-1] - KEEP_SECONDS)
+    if too_old > 0:
+      self.fine = {c: v[too_old:] for c, v in self.fine.items()}
+      self.resampled = {}
+
+    # Only buckets at or after the first new bar need recomputing
+    for interval, cols in self.resampled.items():
+      width = INTERVAL_SECONDS[interval]
+      first_bucket = (first_new // width) * width
+      keep_rows = np.searchsorted(cols['ts'], first_bucket)
+      tail_start = np.searchsorted(self.fine['ts'], first_bucket)
+      tail = resample_columns({c: v[tail_start:] for c, v in self.fine.items()}, width)
+      self.resampled[interval] = {c: np.concatenate((cols[c][:keep_rows], tail[c])) for c in COLUMNS}
+
+  def columns(self, interval='5minute'):
+    if interval == '5minute':
+      return self.fine
+    if not interval in self.resampled:
+      self.resampled[interval] = resample_columns(self.fine, INTERVAL_SECONDS[interval])
+    return self.resampled[interval]
+
+  # Pull new 5-minute bars from the API. Only a day is requested when the
+  # store is already up to date, a week when it is empty or stale.
+  def refresh(self, force=False):
+    now = time.time()
+    if not force and now - self.last_refresh < REFRESH_SECONDS:
+      return
+    have_recent = len(self.fine['ts']) > 0 and now - self.fine['ts'][-1] < SPAN_SECONDS['day'] - 60*60
+    span = 'day' if have_recent else 'week'
+    historicals = robinhood.crypto.get_crypto_historicals(self.sec, interval='5minute', span=span)
+    with open(self.path + '.lock', 'a') as lock_fd:
+      fcntl.flock(lock_fd, fcntl.LOCK_EX)
+      try:
+        # Merge first so the last writer doesn't drop history the others kept
+        self.merge_saved()
+        self.update(historicals)
+        self.save()
+      finally:
+        fcntl.flock(lock_fd, fcntl.LOCK_UN)
+    self.last_refresh = now
+
+  def bars(self, interval='5minute', span=None):
+    cols = self.columns(interval)
+    start = 0
+    if span is not None and len(cols['ts']) > 0:
+      start = np.searchsorted(cols['ts'], cols['ts'][-1] - SPAN_SECONDS[span], side='right')
+    return [
+      {
+        'begins_at': format_ts(cols['ts'][i]),
+        'open_price': float(cols['open'][i]),
+        'high_price': float(cols['high'][i]),
+        'low_price': float(cols['low'][i]),
+        'close_price': float(cols['close'][i]),
+        'volume': float(cols['volume'][i]),
+        'symbol': '{}-USD'.format(self.sec),
+      }
+      for i in range(start, len(cols['ts']))
+    ]
+
+
+stores = {}
+stores_lock = threading.Lock()
+
+def get_store(sec):
+  with stores_lock:
+    if not sec in stores:
+      stores[sec] = BarStore(sec)
+    return stores[sec]
+
+# Drop-in for robinhood.crypto.get_crypto_historicals(sec, interval, span)
+# backed by the local store. Spans longer than the store has collected so far
+# return everything available.
+def get_bars(sec, interval='5minute', span='week'):
+  store = get_store(sec)
+  with store.lock:
+    store.refresh()
+    return store.bars(interval, span)
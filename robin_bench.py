@@ -0,0 +1,242 @@
+
+# Micro-benchmarks for the pure-compute hot paths, with regression thresholds.
+#
+# python robin_bench.py [save] [name-filter ...]
+#
+# Every case runs on synthetic 5-minute bars at a day, a week and a month of
+# data (or at several cache sizes for the cached decorator). For each case the
+# best time per call and the peak allocation (tracemalloc) are recorded and
+# compared against the saved baseline; the run exits 1 when either is more
+# than ROBIN_BENCH_MARGIN worse. 'save' stores this run as the new baseline.
+# Baselines are per machine, so they live in /tmp like the rest of our state.
+#
+# ROBIN_BENCH_BASELINE=/tmp/.robin_bench_baseline.json
+# ROBIN_BENCH_MARGIN=0.25 # fail when 25% slower / bigger than the baseline
+
+import os
+import sys
+import json
+import random
+import timeit
+import tempfile
+import tracemalloc
+
+import robin
+import robin_movavg
+import robin_strategy
+import robin_bars
+from robin_ledger import Ledger
+
+BASELINE_FILE = os.environ.get('ROBIN_BENCH_BASELINE', '/tmp/.robin_bench_baseline.json')
+MARGIN = float(os.environ['ROBIN_BENCH_MARGIN']) if 'ROBIN_BENCH_MARGIN' in os.environ else 0.25
+
+SIZES = {
+  'day': 12*24,
+  'week': 12*24*7,
+  'month': 12*24*30,
+}
+CACHE_SIZES = [100, 1000, 10000]
+
+REPEATS = 5
+# Peak allocation differences smaller than this are noise, not regressions
+PEAK_SLACK_BYTES = 4096
+
+def synthetic_closes(n, seed=0):
+  rng = random.Random(seed)
+  price = 100.0
+  closes = []
+  for i in range(n):
+    price *= 1.0 + rng.gauss(0.0, 0.002)
+    closes.append(price)
+  return closes
+
+def synthetic_bars(n, seed=0):
+  bars = []
+  t0 = 1700000000 // 300 * 300
+  for i, close in enumerate(synthetic_closes(n, seed)):
+    bars.append({
+      'begins_at': robin_bars.format_ts(t0 + i * 300),
+      'open_price': str(close * 0.999),
+      'high_price': str(close * 1.002),
+      'low_price': str(close * 0.998),
+      'close_price': str(close),
+      'volume': '1.0',
+    })
+  return bars
+
+
+# Each case factory returns a zero-argument function to time
+def case_moving_avg(n):
+  history = synthetic_closes(n)
+  return lambda: robin_movavg.moving_avg_6hr(history)
+
+def case_avg(n):
+  history = synthetic_closes(n)
+  return lambda: robin_movavg.avg(history)
+
+def case_rolling_mean(n):
+  history = synthetic_closes(n)
+  return lambda: robin_strategy.rolling_mean(history, 12*6)
+
+# Records are built as usual but never hit the disk, so the case times the
+# simulation and not a growing ledger file
+class NullLedger(Ledger):
+  def write(self, records):
+    pass
+
+def case_sim_strat(n):
+  history = synthetic_closes(n)
+  strategy = robin_strategy.make_strategy('ma_cross')
+  ledger = NullLedger(path=os.devnull, mode='sim', quiet=True)
+  # Every bar after the long moving average has filled, so time scales with n
+  ticks = n - 12*6 - 1
+  devnull = open(os.devnull, 'w')
+
+  def run():
+    saved_ticks = robin_movavg.SIMULATION_TICKS
+    saved_stdout = sys.stdout
+    robin_movavg.SIMULATION_TICKS = ticks
+    sys.stdout = devnull
+    try:
+      robin_movavg.sim_strat('BENCH', history, strategy, ledger)
+    finally:
+      sys.stdout = saved_stdout
+      robin_movavg.SIMULATION_TICKS = saved_ticks
+  return run
+
+def case_volatility(n):
+  bars = synthetic_bars(n)
+  return lambda: robin.volatility_percent(bars, n * 5)
+
+def case_resample(n):
+  store = robin_bars.BarStore('BENCH', path=os.path.join(tempfile.mkdtemp(), 'bars.pickle'))
+  store.update(synthetic_bars(n))
+  return lambda: robin_bars.resample_columns(store.fine, robin_bars.INTERVAL_SECONDS['hour'])
+
+def cached_function(entries):
+  path = os.path.join(tempfile.mkdtemp(), 'cache.bin')
+  @robin_movavg.cached(path)
+  def f(a, b):
+    return [a, b]
+  for i in range(entries):
+    f('SEC', i)
+  return f
+
+def case_cached_hit(entries):
+  f = cached_function(entries)
+  return lambda: f('SEC', 0)
+
+# A miss pickles the whole cache to disk; the new entry is dropped again
+# afterwards so every call sees the same cache size
+def case_cached_miss(entries):
+  f = cached_function(entries)
+  def run():
+    f('SEC', -1)
+    del f.cache[('SEC', -1)]
+  return run
+
+def case_one_hot_encode(n):
+  import robin_ml
+  cents = [int(c * 100.0) for c in synthetic_closes(n)]
+  return lambda: robin_ml.one_hot_encode(cents)
+
+def case_generate_data(n):
+  import robin_ml
+  bars = synthetic_bars(n)
+  def run():
+    robin_ml.q = bars
+    robin_ml.generate_data()
+  return run
+
+CASES = [
+  ('moving_avg', case_moving_avg, SIZES),
+  ('avg', case_avg, SIZES),
+  ('rolling_mean', case_rolling_mean, SIZES),
+  ('sim_strat', case_sim_strat, SIZES),
+  ('volatility_percent', case_volatility, SIZES),
+  ('resample_hour', case_resample, SIZES),
+  ('cached_hit', case_cached_hit, {str(n): n for n in CACHE_SIZES}),
+  ('cached_miss', case_cached_miss, {str(n): n for n in CACHE_SIZES}),
+  # one-hot vectors are MAX_VAL wide, a day of bars is already 46MB
+  ('one_hot_encode', case_one_hot_encode, {'2hr': 25, 'day': SIZES['day']}),
+  ('generate_data', case_generate_data, {'week': SIZES['week']}),
+]
+
+
+# Best seconds per call; like `python -m timeit`, calls are batched so each
+# measurement takes at least 0.2s
+def time_call(fn):
+  timer = timeit.Timer(fn)
+  number, _ = timer.autorange()
+  return min(timer.repeat(repeat=REPEATS, number=number)) / number
+
+def peak_bytes(fn):
+  tracemalloc.start()
+  try:
+    fn()
+    return tracemalloc.get_traced_memory()[1]
+  finally:
+    tracemalloc.stop()
+
+def run_cases(filters):
+  results = {}
+  for name, factory, sizes in CASES:
+    for size_name, size in sizes.items():
+      key = '{}[{}]'.format(name, size_name)
+      if filters and not any(f in key for f in filters):
+        continue
+      try:
+        fn = factory(size)
+      except ImportError as e:
+        print('{:<32} skipped ({})'.format(key, e))
+        continue
+      results[key] = {'seconds': time_call(fn), 'peak_bytes': peak_bytes(fn)}
+  return results
+
+def load_baseline():
+  if not os.path.exists(BASELINE_FILE):
+    return {}
+  with open(BASELINE_FILE, 'r') as fd:
+    return json.load(fd)
+
+# Returns the number of regressions
+def report(results, baseline):
+  regressions = 0
+  print('{:<32} {:>12} {:>10} {:>12} {:>10}'.format('case', 'time', 'vs base', 'peak KiB', 'vs base'))
+  for key, r in results.items():
+    base = baseline.get(key)
+    time_ratio = r['seconds'] / base['seconds'] if base else None
+    mem_ratio = r['peak_bytes'] / max(base['peak_bytes'], 1) if base else None
+    flag = ''
+    mem_regressed = base and mem_ratio > 1.0 + MARGIN and r['peak_bytes'] - base['peak_bytes'] > PEAK_SLACK_BYTES
+    if base and (time_ratio > 1.0 + MARGIN or mem_regressed):
+      flag = ' REGRESSION'
+      regressions += 1
+    print('{:<32} {:>10}us {:>10} {:>12} {:>10}{}'.format(
+      key, round(r['seconds'] * 1e6, 1),
+      '' if time_ratio is None else '{}x'.format(round(time_ratio, 2)),
+      round(r['peak_bytes'] / 1024.0, 1),
+      '' if mem_ratio is None else '{}x'.format(round(mem_ratio, 2)),
+      flag,
+    ))
+  return regressions
+
+
+def main(args=sys.argv):
+  filters = [a for a in args[1:] if a != 'save']
+  results = run_cases(filters)
+  baseline = load_baseline()
+  regressions = report(results, baseline)
+
+  if 'save' in args:
+    baseline.update(results)
+    with open(BASELINE_FILE, 'w') as fd:
+      json.dump(baseline, fd, indent=2, sort_keys=True)
+    print('Saved baseline to {}'.format(BASELINE_FILE))
+  elif regressions > 0:
+    print('{} cases regressed by more than {}%'.format(regressions, round(MARGIN * 100.0)))
+    sys.exit(1)
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,282 @@
+
+# Long-running session that keeps account state in memory and serves it to
+# every other process on the host over a Unix socket.
+#
+# python robin_daemon.py                 # run once per host, logs in once
+# python robin_daemon.py query status    # what clients see
+#
+# robin.py status/debug and the idle_speculation workers ask the daemon first
+# and only log in + hit the API themselves when it isn't running. Each piece of
+# state is refetched on its own interval, so any number of clients share one
+# set of API calls. Quotes come from the quote bus when a publisher is running.
+#
+# Protocol, one JSON object per line in each direction:
+#   {"cmd": "status"}                            -> every piece of state + when it was fetched
+#   {"cmd": "get", "what": "profile", "max_age": 10}  -> refetched first if older than max_age
+#   {"cmd": "quote", "sec": "LTC"}
+#   {"cmd": "bars", "sec": "LTC", "interval": "5minute", "span": "day"}
+#   {"cmd": "refresh", "what": "orders"}         -> refetch now, eg. after placing an order
+# Replies carry "ok": true, or "ok": false + "error".
+#
+# ROBIN_DAEMON_SOCKET=/tmp/.robin_daemon.sock
+
+# python -m pip install --user robin_stocks
+from robin_stocks import robinhood
+
+import os
+import sys
+import json
+import time
+import random
+import signal
+import socket
+import threading
+import socketserver
+
+import robin_bars
+import robin_pairs
+import robin_quotebus
+
+SOCKET_PATH = os.environ.get('ROBIN_DAEMON_SOCKET', '/tmp/.robin_daemon.sock')
+CLIENT_TIMEOUT_SECONDS = 5.0
+
+QUOTE_SECURITIES = ['LTC', 'ETC', 'ETH', 'BCH', 'BSV', 'BTC']
+
+# Seconds between refetches of each piece of state
+REFRESH_SECONDS = {
+  'profile': 60,
+  'orders': 15,
+  'positions': 30,
+  'quotes': float(os.environ['ROBIN_QUOTE_POLL_SEC']) if 'ROBIN_QUOTE_POLL_SEC' in os.environ else 5.0,
+  'portfolio': 300,
+  'crypto_profile': 300,
+}
+
+def fetch_orders():
+  orders = robinhood.orders.get_all_open_crypto_orders()
+  for order in orders:
+    # Saves every client a pair lookup
+    sec = robin_pairs.symbol_for_pair_id(order['currency_pair_id'])
+    if sec is None:
+      sec = robinhood.crypto.get_crypto_quote_from_id(order['currency_pair_id'], 'symbol').replace('USD', '')
+    order['symbol'] = sec
+  return orders
+
+FETCHERS = {
+  'profile': lambda: robinhood.profiles.load_account_profile(),
+  'orders': fetch_orders,
+  'positions': lambda: robinhood.crypto.get_crypto_positions(),
+  'portfolio': lambda: robinhood.load_portfolio_profile(),
+  'crypto_profile': lambda: robinhood.crypto.load_crypto_profile(),
+}
+
+class State:
+  def __init__(self, securities=QUOTE_SECURITIES):
+    self.securities = list(securities)
+    self.lock = threading.Lock()
+    self.values = {}
+    self.updated = {}
+    self.errors = {}
+    # One lock per key so concurrent requests for the same stale value make one API call
+    self.fetch_locks = {what: threading.Lock() for what in REFRESH_SECONDS}
+    self.fetchers = dict(FETCHERS)
+    self.fetchers['quotes'] = self.fetch_quotes
+
+  def fetch_quotes(self):
+    quotes = {}
+    for sec in list(self.securities):
+      quotes[sec] = robin_quotebus.get_crypto_quote(sec)
+    return quotes
+
+  def age(self, what):
+    with self.lock:
+      return time.time() - self.updated.get(what, 0.0)
+
+  def refresh(self, what):
+    if not what in self.fetchers:
+      raise ValueError('Unknown state {}, expected one of {}'.format(what, sorted(self.fetchers)))
+    with self.fetch_locks[what]:
+      begin = time.time()
+      try:
+        value = self.fetchers[what]()
+      except Exception as e:
+        with self.lock:
+          self.errors[what] = str(e)
+        raise
+      with self.lock:
+        self.values[what] = value
+        self.updated[what] = begin
+        self.errors.pop(what, None)
+      return value
+
+  def get(self, what, max_age=None):
+    max_age = REFRESH_SECONDS.get(what, 0.0) if max_age is None else max_age
+    if self.age(what) > max_age:
+      return self.refresh(what)
+    with self.lock:
+      return self.values[what]
+
+  def quote(self, sec):
+    with self.lock:
+      quotes = self.values.get('quotes', {})
+      if sec in quotes and time.time() - self.updated['quotes'] <= REFRESH_SECONDS['quotes']:
+        return quotes[sec]
+      if not sec in self.securities:
+        # Kept fresh from now on
+        self.securities.append(sec)
+    return robin_quotebus.get_crypto_quote(sec)
+
+  def snapshot(self):
+    with self.lock:
+      now = time.time()
+      return {
+        'values': dict(self.values),
+        'age': {what: round(now - t, 3) for what, t in self.updated.items()},
+        'errors': dict(self.errors),
+      }
+
+  # Background thread, refetches whatever is due
+  def refresh_forever(self):
+    while True:
+      for what in REFRESH_SECONDS:
+        if self.age(what) >= REFRESH_SECONDS[what]:
+          try:
+            self.refresh(what)
+          except Exception as e:
+            print('refresh {}: {}'.format(what, e))
+      time.sleep(1.0)
+
+
+class Handler(socketserver.StreamRequestHandler):
+  def handle(self):
+    for line in self.rfile:
+      try:
+        request = json.loads(line)
+        reply = self.server.dispatch(request)
+        reply['ok'] = True
+      except Exception as e:
+        reply = {'ok': False, 'error': '{}: {}'.format(type(e).__name__, e)}
+      self.wfile.write((json.dumps(reply) + '\n').encode('utf-8'))
+      self.wfile.flush()
+
+class Server(socketserver.ThreadingUnixStreamServer):
+  daemon_threads = True
+
+  def __init__(self, state, path=SOCKET_PATH):
+    self.state = state
+    if os.path.exists(path):
+      if query('ping', path=path) is not None:
+        raise RuntimeError('Another daemon is already serving {}'.format(path))
+      os.unlink(path)  # left behind by a daemon that was killed
+    super().__init__(path, Handler)
+    os.chmod(path, 0o600)
+
+  def dispatch(self, request):
+    cmd = request.get('cmd')
+    state = self.state
+    if cmd == 'ping':
+      return {'pid': os.getpid()}
+    elif cmd == 'status':
+      return state.snapshot()
+    elif cmd == 'get':
+      max_age = request.get('max_age')
+      return {'value': state.get(request['what'], None if max_age is None else float(max_age))}
+    elif cmd == 'refresh':
+      return {'value': state.refresh(request['what'])}
+    elif cmd == 'quote':
+      return {'value': state.quote(request['sec'])}
+    elif cmd == 'bars':
+      return {'value': robin_bars.get_bars(request['sec'], request.get('interval', '5minute'), request.get('span', 'week'))}
+    raise ValueError('Unknown cmd {}'.format(cmd))
+
+
+# Client side. Returns the reply dict, or None when no daemon is running
+# (or it failed), in which case the caller should go to the API itself.
+def query(cmd, path=SOCKET_PATH, timeout=CLIENT_TIMEOUT_SECONDS, **fields):
+  if not os.path.exists(path):
+    return None
+  request = dict(fields)
+  request['cmd'] = cmd
+  try:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+      s.settimeout(timeout)
+      s.connect(path)
+      s.sendall((json.dumps(request) + '\n').encode('utf-8'))
+      with s.makefile('rb') as fd:
+        line = fd.readline()
+  except OSError:
+    return None
+  if not line:
+    return None
+  reply = json.loads(line)
+  if not reply.get('ok'):
+    print('WARN: robin_daemon {}: {}'.format(cmd, reply.get('error')))
+    return None
+  return reply
+
+# One piece of state, fetched by the daemon if it is older than max_age seconds
+def get(what, max_age=None):
+  reply = query('get', what=what, max_age=max_age)
+  return None if reply is None else reply['value']
+
+def refresh(what):
+  reply = query('refresh', what=what)
+  return None if reply is None else reply['value']
+
+# From the daemon when one is running, else straight from the API
+def get_or_fetch(what, max_age=None):
+  value = get(what, max_age)
+  return FETCHERS[what]() if value is None else value
+
+# Drop-in for robinhood.crypto.get_crypto_quote(sec)
+def get_crypto_quote(sec):
+  reply = query('quote', sec=sec)
+  return robin_quotebus.get_crypto_quote(sec) if reply is None else reply['value']
+
+
+def serve_forever(securities):
+  state = State(securities)
+  server = Server(state)
+
+  def on_exit(sig, frame):
+    os.unlink(SOCKET_PATH)
+    sys.exit(0)
+  signal.signal(signal.SIGINT, on_exit)
+  signal.signal(signal.SIGTERM, on_exit)
+
+  threading.Thread(target=state.refresh_forever, daemon=True).start()
+  print('Serving account state for {} on {}'.format(securities, SOCKET_PATH))
+  server.serve_forever()
+
+
+def main(args=sys.argv):
+  if 'query' in args:
+    rest = args[args.index('query')+1:]
+    cmd = rest[0] if len(rest) > 0 else 'status'
+    fields = dict(a.split('=', 1) for a in rest[1:] if '=' in a)
+    reply = query(cmd, **fields)
+    if reply is None:
+      print('No daemon answering on {}'.format(SOCKET_PATH))
+      return
+    print(json.dumps(reply, sort_keys=True, indent=2))
+
+  else:
+    securities = [a for a in args[1:]]
+    if len(securities) < 1:
+      securities = QUOTE_SECURITIES
+
+    # Ensure generate_device_token always gives
+    # the same machine name.
+    # https://github.com/jmfernandes/robin_stocks/blob/master/robin_stocks/robinhood/authentication.py
+    random.seed(a="123", version=2)
+    login = robinhood.login(
+      'email@example.com',
+      'some-pw-or-token',
+    )
+    random.seed(a=str(time.time()), version=2)
+
+    serve_forever(securities)
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,120 @@
+
+# Background thread for side effects that must not stall a trading loop:
+# notifications (/j/bin/ding), /tmp/.robin_* bookkeeping and ledger flushes.
+#
+#   robin_dispatch.notify('$1.02 ($14.20)')
+#   robin_dispatch.call(ledger.flush, key='ledger')
+#
+# Events go into a bounded queue and never block the caller; if the queue is
+# full the event is dropped and counted. The worker handles events in batches:
+# notifications queued together are sent as one message and only the newest
+# call for a given key runs. Everything still queued runs at exit.
+#
+# ROBIN_NOTIFY_CMD=/j/bin/ding # program run with the notification text as its argument
+
+import os
+import queue
+import atexit
+import threading
+import subprocess
+
+NOTIFY_CMD = os.environ.get('ROBIN_NOTIFY_CMD', '/j/bin/ding')
+NOTIFY_TIMEOUT_SECONDS = 30
+QUEUE_SIZE = 1024
+BATCH_SIZE = 64
+SHUTDOWN_TIMEOUT_SECONDS = 10
+
+STOP = object()
+
+class Dispatcher:
+  def __init__(self, maxsize=QUEUE_SIZE, batch_size=BATCH_SIZE):
+    self.events = queue.Queue(maxsize=maxsize)
+    self.batch_size = batch_size
+    self.dropped = 0
+    self.thread = threading.Thread(target=self.run, name='robin_dispatch', daemon=True)
+    self.thread.start()
+    atexit.register(self.shutdown)
+
+  def put(self, event):
+    try:
+      self.events.put_nowait(event)
+    except queue.Full:
+      self.dropped += 1
+      print('WARN: dispatch queue full, dropped {} events'.format(self.dropped))
+
+  def notify(self, msg):
+    self.put(('notify', None, msg, ()))
+
+  # Run fn(*args) on the dispatch thread. Calls sharing a key are coalesced,
+  # only the most recent one in a batch runs.
+  def call(self, fn, *args, key=None):
+    self.put(('call', key, fn, args))
+
+  def run(self):
+    stopping = False
+    while not stopping:
+      batch = [self.events.get()]
+      while len(batch) < self.batch_size:
+        try:
+          batch.append(self.events.get_nowait())
+        except queue.Empty:
+          break
+      if STOP in batch:
+        stopping = True
+        batch = [e for e in batch if e is not STOP]
+        # Drain whatever was queued behind the stop request too
+        while True:
+          try:
+            batch.append(self.events.get_nowait())
+          except queue.Empty:
+            break
+      self.handle(batch)
+
+  def handle(self, batch):
+    messages = [e[2] for e in batch if e[0] == 'notify']
+    newest_for_key = {}
+    for i, e in enumerate(batch):
+      if e[0] == 'call' and e[1] is not None:
+        newest_for_key[e[1]] = i
+
+    for i, e in enumerate(batch):
+      if e[0] != 'call' or (e[1] is not None and newest_for_key[e[1]] != i):
+        continue
+      try:
+        e[2](*e[3])
+      except Exception as ex:
+        print('WARN: dispatched {} failed: {}'.format(getattr(e[2], '__name__', e[2]), ex))
+
+    if messages:
+      self.send_notification(' | '.join(messages))
+
+  def send_notification(self, msg):
+    try:
+      subprocess.run([NOTIFY_CMD, msg], timeout=NOTIFY_TIMEOUT_SECONDS)
+    except Exception as e:
+      print('WARN: {} failed: {}'.format(NOTIFY_CMD, e))
+
+  def shutdown(self, timeout=SHUTDOWN_TIMEOUT_SECONDS):
+    if self.thread.is_alive():
+      try:
+        self.events.put(STOP, timeout=timeout)
+      except queue.Full:
+        pass
+      self.thread.join(timeout)
+
+
+dispatcher = None
+dispatcher_lock = threading.Lock()
+
+def get_dispatcher():
+  global dispatcher
+  with dispatcher_lock:
+    if dispatcher is None:
+      dispatcher = Dispatcher()
+  return dispatcher
+
+def notify(msg):
+  get_dispatcher().notify(msg)
+
+def call(fn, *args, key=None):
+  get_dispatcher().call(fn, *args, key=key)
@@ -0,0 +1,155 @@
+
+# Structured trade ledger shared by live trading (robin.py, robin_movavg.py)
+# and backtests (robin_movavg.py sim). Every decision, order, fill and P&L
+# change is one record with the same columns no matter where it came from,
+# so runs can be analyzed without scraping stdout.
+#
+# ROBIN_LEDGER=/tmp/.robin_ledger.jsonl # where records go; .csv or .jsonl
+# ROBIN_QUIET=1 # suppress per-tick console output (records are still written)
+
+import os
+import sys
+import csv
+import json
+import time
+import atexit
+import threading
+
+LEDGER_FIELDS = [
+  'ts',        # unix time the record was made (sim: tick index)
+  'run',       # pid-starttime of the process writing the record
+  'mode',      # 'live', 'sim', ...
+  'sec',       # security symbol, eg 'BTC'
+  'event',     # 'decision', 'order', 'fill', 'cancel', 'pnl'
+  'side',      # 'buy', 'sell', 'hold' or ''
+  'price',
+  'quantity',
+  'cash',
+  'shares',
+  'pnl',
+  'order_id',
+  'elapsed_s', # seconds from order placement to this event
+  'note',
+]
+
+DEFAULT_LEDGER_PATH = '/tmp/.robin_ledger.jsonl'
+
+def quiet_requested(args=sys.argv):
+  return 'quiet' in args or os.environ.get('ROBIN_QUIET', '') not in ('', '0')
+
+class Ledger:
+  def __init__(self, path=None, mode='live', quiet=False, buffer_records=4096):
+    if path is None:
+      path = os.environ.get('ROBIN_LEDGER', DEFAULT_LEDGER_PATH)
+    self.path = path
+    self.mode = mode
+    self.quiet = quiet
+    self.buffer_records = buffer_records
+    self.run = '{}-{}'.format(os.getpid(), int(time.time()))
+    self.is_csv = path.endswith('.csv')
+    self.pending = []
+    self.closed = False
+    # lock guards pending, write_lock keeps swapped batches in order on disk
+    self.lock = threading.Lock()
+    self.write_lock = threading.Lock()
+    atexit.register(self.close)
+
+  # Print human-readable progress unless running quiet
+  def say(self, msg='', end='\n', flush=False):
+    if not self.quiet:
+      print(msg, end=end, flush=flush)
+
+  def record(self, event, sec='', ts=None, **fields):
+    rec = dict.fromkeys(LEDGER_FIELDS, '')
+    rec.update(fields)
+    rec['ts'] = time.time() if ts is None else ts
+    rec['run'] = self.run
+    rec['mode'] = self.mode
+    rec['sec'] = sec
+    rec['event'] = event
+    with self.lock:
+      self.pending.append(rec)
+      full = len(self.pending) >= self.buffer_records
+    if full:
+      self.flush()
+
+  # Safe to call from robin_dispatch's thread while the loop keeps recording;
+  # the list is swapped under the lock and written outside it
+  def flush(self):
+    with self.write_lock:
+      with self.lock:
+        records = self.pending
+        self.pending = []
+      if records:
+        self.write(records)
+
+  def write(self, records):
+    write_header = self.is_csv and (not os.path.exists(self.path) or os.path.getsize(self.path) == 0)
+    with open(self.path, 'a', newline='') as fd:
+      if self.is_csv:
+        writer = csv.DictWriter(fd, fieldnames=LEDGER_FIELDS, extrasaction='ignore')
+        if write_header:
+          writer.writeheader()
+        writer.writerows(records)
+      else:
+        fd.write(''.join(json.dumps(r) + '\n' for r in records))
+
+  def close(self):
+    if not self.closed:
+      self.flush()
+      self.closed = True
+
+
+# Load a ledger file as columns: {'price': [...], 'sec': [...], ...}
+# Numeric columns come back as floats (or None where a record left them empty).
+def read_columns(path):
+  columns = {f: [] for f in LEDGER_FIELDS}
+  with open(path, 'r', newline='') as fd:
+    if path.endswith('.csv'):
+      rows = csv.DictReader(fd)
+    else:
+      rows = (json.loads(line) for line in fd if line.strip())
+    for row in rows:
+      for f in LEDGER_FIELDS:
+        columns[f].append(row.get(f, ''))
+
+  for f in ('ts', 'price', 'quantity', 'cash', 'shares', 'pnl', 'elapsed_s'):
+    columns[f] = [float(x) if x not in ('', None) else None for x in columns[f]]
+  return columns
+
+
+# Buy time-to-fill per fill note (eg 'reprice' vs 'timeout' in robin.py):
+# {note: (fills, cancels, median seconds, 90th percentile seconds)}
+def fill_time_summary(cols):
+  waits = {}
+  cancels = {}
+  for event, side, elapsed, note in zip(cols['event'], cols['side'], cols['elapsed_s'], cols['note']):
+    if side != 'buy' or elapsed is None:
+      continue
+    if event == 'fill':
+      waits.setdefault(note, []).append(elapsed)
+    elif event == 'cancel' and note != 'replaced':
+      cancels[note] = cancels.get(note, 0) + 1
+  summary = {}
+  for note, w in waits.items():
+    w = sorted(w)
+    summary[note] = (len(w), cancels.get(note, 0), w[len(w) // 2], w[min(len(w) - 1, int(len(w) * 0.9))])
+  return summary
+
+
+if __name__ == '__main__':
+  # python robin_ledger.py [path] [fills]
+  #   print per-run, per-event record counts, or buy time-to-fill stats with 'fills'
+  paths = [a for a in sys.argv[1:] if a != 'fills']
+  path = paths[0] if paths else os.environ.get('ROBIN_LEDGER', DEFAULT_LEDGER_PATH)
+  cols = read_columns(path)
+  if 'fills' in sys.argv:
+    for note, (n, cancelled, median, p90) in sorted(fill_time_summary(cols).items()):
+      print('{:<10} fills={:<5} cancels={:<5} median={}s p90={}s'.format(note or '-', n, cancelled, median, p90))
+  else:
+    counts = {}
+    for run, mode, event in zip(cols['run'], cols['mode'], cols['event']):
+      key = (run, mode, event)
+      counts[key] = counts.get(key, 0) + 1
+    for (run, mode, event), n in sorted(counts.items()):
+      print('{:<24} {:<6} {:<10} {}'.format(run, mode, event, n))
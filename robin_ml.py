@@ -19,11 +19,15 @@ import signal
 import io
 from datetime import datetime, timezone
 
+import robin_bars
+import robin_ml_store
+
 locale.setlocale(locale.LC_ALL, '')
 
 # ML-dependencies:
 # python -m pip install --user numpy pandas keras tensorflow tensorflow-cpu
 from random import randint
+import numpy
 from numpy import array
 from numpy import argmax
 from pandas import concat
@@ -54,6 +58,18 @@ def generate_sequence(length=25):
 
 MAX_VAL = int(200 * 100)
 
+# Models are checkpointed to robin_ml_store.py after every run, next to the
+# evaluation batch they were last checked against (read by robin_ml_export.py).
+# A later run loads the newest checkpoint for the security and only fine-tunes
+# on bars that arrived since, unless told to 'retrain' or the validation loss
+# has drifted more than ROBIN_ML_MAX_DRIFT (eg. 0.5 = 50% worse) since the
+# checkpoint was saved.
+FULL_ITERATIONS = 3000
+FINETUNE_ITERATIONS_PER_BAR = 10
+MIN_FINETUNE_ITERATIONS = 50
+SEQUENCE_LEN = 25 # bars per generate_sequence() window
+MAX_DRIFT = float(os.environ['ROBIN_ML_MAX_DRIFT']) if 'ROBIN_ML_MAX_DRIFT' in os.environ else None
+
 # one hot encode sequence
 def one_hot_encode(sequence, n_unique=MAX_VAL):
     encoding = list()
@@ -86,6 +102,32 @@ def generate_data():
     return x, y
 
 
+def new_model():
+  model = Sequential()
+  model.add(LSTM(50, batch_input_shape=(5, 5, MAX_VAL), stateful=True))
+  model.add(Dense(MAX_VAL, activation='softmax'))
+  model.compile(loss='categorical_crossentropy', optimizer='adam', metrics=['acc'])
+  return model
+
+# Fits model on random windows of bars
+def train(model, bars, iterations):
+  global q
+  q = bars
+  for i in range(iterations):
+      x, y = generate_data()
+      model.fit(x, y, epochs=2, batch_size=5, verbose=2, shuffle=False)
+      model.reset_states()
+
+def validation_loss(model, x, y):
+  model.reset_states()
+  loss, acc = model.evaluate(x, y, batch_size=5, verbose=0)
+  model.reset_states()
+  return loss
+
+def bar_ts(bar):
+  return robin_bars.parse_ts(bar['begins_at'])
+
+
 q = []
 def main(args=sys.argv):
   global active_buy_order_id
@@ -109,8 +151,9 @@ def main(args=sys.argv):
     'ETC'
   ]
   mv_sec = random.choice(crypto_securities)
-  # https://robin-stocks.readthedocs.io/en/latest/robinhood.html#robin_stocks.robinhood.crypto.get_crypto_historicals
-  q = robinhood.crypto.get_crypto_historicals(
+  # Hourly bars resampled from the local 5-minute store (robin_bars.py).
+  # Until the store has collected a month of bars this trains on what it has.
+  q = robin_bars.get_bars(
     #mv_sec, interval='5minute', span='week'
     mv_sec, interval='hour', span='month'
   )
@@ -119,24 +162,79 @@ def main(args=sys.argv):
   q = q[0:len(q)-current_n]
   print('Dataset len = {}'.format(len(q)))
 
-  # define model
-  model = Sequential()
-  model.add(LSTM(50, batch_input_shape=(5, 5, MAX_VAL), stateful=True))
-  model.add(Dense(MAX_VAL, activation='softmax'))
-  model.compile(loss='categorical_crossentropy', optimizer='adam', metrics=['acc'])
-  # fit model
-  for i in range(3000):
-      x, y = generate_data()
-      model.fit(x, y, epochs=2, batch_size=5, verbose=2, shuffle=False)
-      model.reset_states()
-  
-  # evaluate model on new data
+  train_q = q
+  # Validation windows: the newest bars, never trained on
   q = nontrain_q
-  x, y = generate_data()
+  val_x, val_y = generate_data()
+
+  model = None
+  checkpoint = None if 'retrain' in args else robin_ml_store.latest_checkpoint(mv_sec)
+  if checkpoint:
+    path, meta = checkpoint
+    model = keras.models.load_model(path)
+    val_loss = validation_loss(model, val_x, val_y)
+    drift = val_loss / max(meta['val_loss'], 1e-9) - 1.0
+    print('Loaded {} (val_loss {} -> {}, {}% drift)'.format(
+      path, round(meta['val_loss'], 4), round(val_loss, 4), round(drift * 100.0, 1),
+    ))
+    if MAX_DRIFT is not None and drift > MAX_DRIFT:
+      print('Drift above {}%, retraining from scratch'.format(round(MAX_DRIFT * 100.0, 1)))
+      model = None
+      checkpoint = None
+
+  if model is None:
+    model = new_model()
+    mode = 'full'
+    bars = train_q
+    iterations = FULL_ITERATIONS
+    first_ts = bar_ts(train_q[0])
+    total_iterations = iterations
+  else:
+    mode = 'finetune'
+    bars = [x for x in train_q if bar_ts(x) > meta['last_ts']]
+    iterations = min(FULL_ITERATIONS, max(MIN_FINETUNE_ITERATIONS, FINETUNE_ITERATIONS_PER_BAR * len(bars))) if len(bars) > 0 else 0
+    first_ts = meta['first_ts']
+    total_iterations = meta['total_iterations'] + iterations
+    # Windows that end in the new bars need the SEQUENCE_LEN-1 bars before them
+    bars = train_q[-(len(bars) + SEQUENCE_LEN - 1):] if len(bars) > 0 else []
+
+  if iterations > 0:
+    print('{} training on {} bars for {} iterations'.format(mode, len(bars), iterations))
+    begin = time.time()
+    train(model, bars, iterations)
+    print('Trained in {}s'.format(round(time.time() - begin, 1)))
+  else:
+    print('No bars since {}, reusing the checkpoint as is'.format(checkpoint[0]))
+
+  # evaluate model on new data
+  x, y = val_x, val_y
+  val_loss = validation_loss(model, x, y)
   yhat = model.predict(x, batch_size=5)
+  model.reset_states()
   print('mv_sec = {}'.format(mv_sec))
   print('Expected:  %s' % one_hot_decode(y))
   print('Predicted: %s' % one_hot_decode(yhat))
+  print('val_loss = {}'.format(val_loss))
+
+  if iterations > 0:
+    last_ts = bar_ts(train_q[-1])
+    path = robin_ml_store.checkpoint_path(mv_sec, first_ts, last_ts)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    model.save(path)
+    numpy.savez_compressed(path + '.eval.npz', x=x, y=y)
+    robin_ml_store.save_metadata(path, {
+      'sec': mv_sec,
+      'interval': 'hour',
+      'first_ts': first_ts,
+      'last_ts': last_ts,
+      'mode': mode,
+      'bars': len(bars),
+      'iterations': iterations,
+      'total_iterations': total_iterations,
+      'val_loss': val_loss,
+      'parent': checkpoint[0] if checkpoint else None,
+    })
+    print('Saved model to {}'.format(path))
 
   y_arr = [int(i.strip()) for i in str(one_hot_decode(y))[1:-1].split(",")]
   yhat_arr = [int(i.strip()) for i in str(one_hot_decode(yhat))[1:-1].split(",")]
@@ -173,7 +271,7 @@ def main(args=sys.argv):
     prediction_minutes = 4*60
     print('Predicting {} using last {}h of data'.format( mv_sec, round(prediction_minutes/60, 1) ))
 
-    q = robinhood.crypto.get_crypto_historicals(mv_sec, interval='5minute', span='day')
+    q = robin_bars.get_bars(mv_sec, interval='5minute', span='day')
     # Grab last prediction_minutes records
     n = int(prediction_minutes / 5)
     q = q[-n:]
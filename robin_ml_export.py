@@ -0,0 +1,109 @@
+
+# Export the robin_ml.py LSTM to TFLite for CPU inference and compare the
+# exports against the original keras model.
+#
+# python robin_ml_export.py [model.keras | SEC]
+#
+# Defaults to the newest robin_ml_store.py checkpoint (of SEC if given).
+# Writes <model>.float32.tflite, <model>.float16.tflite (float16 weights) and
+# <model>.int8.tflite (int8 dynamic range quantized weights), then prints
+# accuracy, agreement with keras, latency and size for each on the evaluation
+# batch robin_ml.py saved next to the model. Serve them with robin_ml_predict.py.
+#
+# The training model is a stateful LSTM with a fixed batch of 5. The export is
+# the same layers with the same weights but stateless with any batch size, so
+# each prediction only sees its own 5-step window; the agreement column shows
+# what that costs.
+
+# ML-dependencies:
+# python -m pip install --user numpy tensorflow
+import os
+import sys
+import time
+
+import numpy as np
+import tensorflow as tf
+from tensorflow.keras.models import Sequential
+from tensorflow.keras.layers import LSTM
+from tensorflow.keras.layers import Dense
+
+from robin_ml_predict import TFLitePredictor, MAX_VAL, LAGS
+import robin_ml_store
+
+QUANTIZATIONS = ['float32', 'float16', 'int8']
+
+def stateless_copy(model):
+  copy = Sequential()
+  copy.add(LSTM(model.layers[0].units, input_shape=(LAGS, MAX_VAL)))
+  copy.add(Dense(MAX_VAL, activation='softmax'))
+  copy.set_weights(model.get_weights())
+  return copy
+
+def export(model, out_path, quantize='float32'):
+  converter = tf.lite.TFLiteConverter.from_keras_model(stateless_copy(model))
+  if quantize == 'float16':
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    converter.target_spec.supported_types = [tf.float16]
+  elif quantize == 'int8':
+    # Dynamic range: int8 weights, activations stay float
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+  with open(out_path, 'wb') as fd:
+    fd.write(converter.convert())
+  return out_path
+
+def keras_latency(model, x, repeat=50):
+  model.predict(x, batch_size=5, verbose=0)
+  begin = time.perf_counter()
+  for i in range(repeat):
+    model.predict(x, batch_size=5, verbose=0)
+    model.reset_states()
+  return (time.perf_counter() - begin) / repeat
+
+def compare(model, exports, x, y):
+  expected = np.argmax(y, axis=1)
+  model.reset_states()
+  keras_pred = np.argmax(model.predict(x, batch_size=5, verbose=0), axis=1)
+  model.reset_states()
+
+  print('{:<10} {:>9} {:>10} {:>12} {:>10}'.format('model', 'accuracy', 'agreement', 'latency ms', 'size KiB'))
+  print('{:<10} {:>9} {:>10} {:>12} {:>10}'.format(
+    'keras', round(np.mean(keras_pred == expected), 3), 1.0,
+    round(keras_latency(model, x) * 1000.0, 3), '',
+  ))
+  for quantize, path in exports:
+    p = TFLitePredictor(path)
+    pred = np.argmax(p.predict(x), axis=1)
+    print('{:<10} {:>9} {:>10} {:>12} {:>10}'.format(
+      quantize, round(np.mean(pred == expected), 3), round(np.mean(pred == keras_pred), 3),
+      round(p.latency(x) * 1000.0, 3), round(os.path.getsize(path) / 1024.0, 1),
+    ))
+
+
+def main(args=sys.argv):
+  if len(args) > 1 and args[1].endswith('.keras'):
+    model_path = args[1]
+  else:
+    checkpoint = robin_ml_store.latest_checkpoint(args[1] if len(args) > 1 else None)
+    if checkpoint is None:
+      print('No checkpoints in {}, run robin_ml.py first'.format(robin_ml_store.CHECKPOINT_DIR))
+      return
+    model_path = checkpoint[0]
+  model = tf.keras.models.load_model(model_path)
+  base = model_path[:-len('.keras')]
+
+  exports = []
+  for quantize in QUANTIZATIONS:
+    path = export(model, '{}.{}.tflite'.format(base, quantize), quantize)
+    print('Wrote {}'.format(path))
+    exports.append((quantize, path))
+
+  eval_file = model_path + '.eval.npz'
+  if os.path.exists(eval_file):
+    data = np.load(eval_file)
+    compare(model, exports, data['x'], data['y'])
+  else:
+    print('No {} to compare against, run robin_ml.py first'.format(eval_file))
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,67 @@
+
+# Minimal predictor for models exported by robin_ml_export.py.
+# Only needs numpy + the TFLite interpreter, not the full tensorflow package:
+#
+# python -m pip install --user numpy tflite-runtime
+#
+# Exports sit next to their checkpoint in ROBIN_ML_CHECKPOINTS (robin_ml_store.py):
+# p = TFLitePredictor('/tmp/.robin_ml_checkpoints/LTC.<first bar ts>-<last bar ts>.int8.tflite')
+# cents = p.predict_label([1523, 1527, 1519, 1530, 1528])  # last 5 closes in cents -> 1530
+#
+# The model is not a forecast: robin_ml.generate_data() trains it against the
+# 4th close of each 5-close window, so what it learns is to pick out cents[-2].
+
+import time
+
+import numpy as np
+
+try:
+  from tflite_runtime.interpreter import Interpreter
+except ImportError:
+  # Works, but drags in all of tensorflow
+  from tensorflow.lite import Interpreter
+
+# Same as robin_ml.MAX_VAL / the lag window robin_ml.generate_data() builds
+MAX_VAL = int(200 * 100)
+LAGS = 5
+
+# closes (in cents) -> one-hot input windows shaped (n windows, LAGS, MAX_VAL)
+def encode_windows(cents):
+  cents = np.clip(np.asarray(cents, dtype=np.int64), 0, MAX_VAL - 1)
+  n = len(cents) - LAGS + 1
+  x = np.zeros((n, LAGS, MAX_VAL), dtype=np.float32)
+  rows = np.arange(n)[:, None]
+  lags = np.arange(LAGS)[None, :]
+  x[rows, lags, cents[rows + lags]] = 1.0
+  return x
+
+class TFLitePredictor:
+  def __init__(self, path, num_threads=1):
+    self.interpreter = Interpreter(model_path=path, num_threads=num_threads)
+    self.input = self.interpreter.get_input_details()[0]
+    self.output = self.interpreter.get_output_details()[0]
+    self.batch = None
+
+  # x: (batch, LAGS, MAX_VAL) -> (batch, MAX_VAL) probabilities
+  def predict(self, x):
+    x = np.asarray(x, dtype=self.input['dtype'])
+    if x.shape[0] != self.batch:
+      self.interpreter.resize_tensor_input(self.input['index'], x.shape)
+      self.interpreter.allocate_tensors()
+      self.batch = x.shape[0]
+    self.interpreter.set_tensor(self.input['index'], x)
+    self.interpreter.invoke()
+    return self.interpreter.get_tensor(self.output['index'])
+
+  # The model's output label for the last LAGS closes in cents, ie. its
+  # reconstruction of cents[-2] (see the note at the top), not the next close
+  def predict_label(self, cents):
+    return int(np.argmax(self.predict(encode_windows(cents[-LAGS:]))[0]))
+
+  # Mean seconds per predict(x) call
+  def latency(self, x, repeat=50):
+    self.predict(x)
+    begin = time.perf_counter()
+    for i in range(repeat):
+      self.predict(x)
+    return (time.perf_counter() - begin) / repeat
@@ -0,0 +1,76 @@
+
+# On-disk store of robin_ml.py checkpoints, keyed by security and the range
+# of bars the model has been trained on.
+#
+# python robin_ml_store.py [SEC]   # list checkpoints, newest last
+#
+# Every checkpoint is <dir>/<SEC>.<first bar ts>-<last bar ts>.keras next to
+# a .json of metadata (validation loss, iterations, which checkpoint it was
+# fine-tuned from). Only needs the standard library, so the exporter and
+# predictors can find models without importing tensorflow.
+#
+# ROBIN_ML_CHECKPOINTS=/tmp/.robin_ml_checkpoints
+# ROBIN_ML_KEEP=5 # checkpoints kept per security, older ones are deleted
+
+import os
+import sys
+import json
+import glob
+import time
+
+CHECKPOINT_DIR = os.environ.get('ROBIN_ML_CHECKPOINTS', '/tmp/.robin_ml_checkpoints')
+KEEP_CHECKPOINTS = int(os.environ['ROBIN_ML_KEEP']) if 'ROBIN_ML_KEEP' in os.environ else 5
+
+def checkpoint_path(sec, first_ts, last_ts, directory=CHECKPOINT_DIR):
+  return os.path.join(directory, '{}.{}-{}.keras'.format(sec, int(first_ts), int(last_ts)))
+
+def metadata_path(path):
+  return path[:-len('.keras')] + '.json'
+
+# Writes metadata for a model already saved at path, then prunes old checkpoints
+def save_metadata(path, meta):
+  meta = dict(meta)
+  meta['path'] = path
+  meta['saved_at'] = time.time()
+  tmp = metadata_path(path) + '.tmp'
+  with open(tmp, 'w') as fd:
+    json.dump(meta, fd, indent=2, sort_keys=True)
+  os.replace(tmp, metadata_path(path))
+  prune(meta['sec'], os.path.dirname(path))
+  return meta
+
+# [(path, meta), ...] oldest first; a checkpoint without metadata is incomplete and skipped
+def list_checkpoints(sec=None, directory=CHECKPOINT_DIR):
+  found = []
+  for meta_file in glob.glob(os.path.join(directory, '{}.*.json'.format(sec or '*'))):
+    try:
+      with open(meta_file, 'r') as fd:
+        meta = json.load(fd)
+    except (OSError, ValueError):
+      continue
+    if os.path.exists(meta['path']):
+      found.append((meta['path'], meta))
+  found.sort(key=lambda c: (c[1]['last_ts'], c[1]['saved_at']))
+  return found
+
+# (path, meta) of the model trained on the newest bars, or None
+def latest_checkpoint(sec=None, directory=CHECKPOINT_DIR):
+  found = list_checkpoints(sec, directory)
+  return found[-1] if found else None
+
+def prune(sec, directory=CHECKPOINT_DIR, keep=KEEP_CHECKPOINTS):
+  for path, meta in list_checkpoints(sec, directory)[:-keep]:
+    for f in glob.glob(path[:-len('.keras')] + '.*'):
+      os.remove(f)
+
+
+def main(args=sys.argv):
+  sec = args[1] if len(args) > 1 else None
+  for path, meta in list_checkpoints(sec):
+    print('{:<60} {:<8} bars={:<5} iters={:<5} val_loss={}'.format(
+      path, meta['mode'], meta['bars'], meta['iterations'], round(meta['val_loss'], 4),
+    ))
+
+
+if __name__ == '__main__':
+  main()
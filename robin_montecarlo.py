@@ -0,0 +1,183 @@
+
+# Monte Carlo stress test of both strategies on synthetic price paths.
+#
+# python robin_montecarlo.py [gbm]
+#
+# Paths are built from the real week of 5-minute closes, either by block
+# bootstrap of its log returns (default) or as geometric brownian motion with
+# the fitted drift + volatility ('gbm'). Every path is run through
+#   ma_cross - the robin_movavg.py sim_strat rules (robin_strategy.py)
+#   bid_ask  - the robin.py idle_speculation rules: limit buy ROBIN_BS_PERCENT
+#              under the price unless near the 6hr high, cancel after
+#              ROBIN_TIMEOUT_SEC, limit sell ROBIN_BS_PERCENT (+0.1%) above the fill
+# Paths are split into chunks run across a process pool; inside a chunk every
+# path advances one tick at a time as a numpy vector.
+#
+# ROBIN_MC_PATHS=10000
+# USE_SECURITY=BTC
+
+import os
+import sys
+import math
+import random
+import locale
+from concurrent.futures import ProcessPoolExecutor
+
+# python -m pip install --user numpy
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+import robin_movavg
+from robin_strategy import make_strategy, BUY, SELL
+
+BAR_SECONDS = 5*60
+BOOTSTRAP_BLOCK = 12 # 1hr blocks keep some of the intraday autocorrelation
+PATHS_PER_CHUNK = 500
+
+# n_paths x length prices starting at start_price
+def generate_paths(returns, n_paths, length, start_price, method='bootstrap', rng=None, block=BOOTSTRAP_BLOCK):
+  rng = rng or np.random.default_rng()
+  steps = length - 1
+  if method == 'gbm':
+    # log returns of GBM are normal with the fitted mean and volatility
+    log_steps = rng.normal(np.mean(returns), np.std(returns), size=(n_paths, steps))
+  else:
+    block = min(block, len(returns))
+    n_blocks = int(math.ceil(steps / block))
+    starts = rng.integers(0, len(returns) - block + 1, size=(n_paths, n_blocks))
+    idx = (starts[:, :, None] + np.arange(block)).reshape(n_paths, n_blocks * block)[:, :steps]
+    log_steps = returns[idx]
+  log_paths = np.concatenate((np.zeros((n_paths, 1)), np.cumsum(log_steps, axis=1)), axis=1)
+  return start_price * np.exp(log_paths)
+
+def max_drawdowns(equity):
+  peaks = np.maximum.accumulate(equity, axis=1)
+  return np.max(1.0 - equity / peaks, axis=1)
+
+# sim_strat over every row of paths; returns (final return, max drawdown) per path
+def sim_ma_paths(paths, strategy, begin_cash, ticks):
+  signals = strategy.signals(paths)
+  n_paths, length = paths.shape
+  start = max(0, length - ticks)
+  cash = np.full(n_paths, begin_cash)
+  shares = np.zeros(n_paths)
+  last_buy_price = np.zeros(n_paths)
+  equity = np.empty((n_paths, length - start))
+
+  for t in range(start, length):
+    price = paths[:, t]
+    buy = (signals[:, t] == BUY) & (cash > 1.00)
+    sell = (signals[:, t] == SELL) & (shares > 0.0) & (price > last_buy_price)
+
+    shares = np.where(buy, shares + cash / price, shares)
+    last_buy_price = np.where(buy, price, last_buy_price)
+    cash = np.where(buy, 0.0, cash)
+
+    cash = np.where(sell, cash + shares * price, cash)
+    shares = np.where(sell, 0.0, shares)
+
+    equity[:, t - start] = cash + shares * price
+
+  return equity[:, -1] / begin_cash - 1.0, max_drawdowns(equity)
+
+# idle_speculation over every row of paths, using closes as both bid and ask
+IDLE, BUYING, SELLING = 0, 1, 2
+def sim_bid_ask_paths(paths, begin_cash, ticks, buy_sell_percent, timeout_ticks, max_bid_percent=0.999, max_price_ticks=12*6):
+  n_paths, length = paths.shape
+  start = max(max_price_ticks - 1, length - ticks)
+  highs = sliding_window_view(paths, max_price_ticks, axis=1).max(axis=2)  # highs[:, t - max_price_ticks + 1]
+
+  state = np.full(n_paths, IDLE)
+  cash = np.full(n_paths, begin_cash)
+  shares = np.zeros(n_paths)
+  limit = np.zeros(n_paths)
+  placed_at = np.zeros(n_paths, dtype=np.int64)
+  equity = np.empty((n_paths, length - start))
+
+  for t in range(start, length):
+    price = paths[:, t]
+
+    # Resting sells fill once the price reaches the ask
+    sold = (state == SELLING) & (price >= limit)
+    cash = np.where(sold, shares * limit, cash)
+    shares = np.where(sold, 0.0, shares)
+    state = np.where(sold, IDLE, state)
+
+    # Resting buys fill once the price drops to the bid, or are cancelled
+    bought = (state == BUYING) & (price <= limit)
+    shares = np.where(bought, cash / np.where(bought, limit, 1.0), shares)
+    cash = np.where(bought, 0.0, cash)
+    limit = np.where(bought, limit * (1.001 + buy_sell_percent), limit)
+    state = np.where(bought, SELLING, state)
+    timed_out = (state == BUYING) & (t - placed_at >= timeout_ticks)
+    state = np.where(timed_out, IDLE, state)
+
+    # Idle paths bid below the market unless it is near the recent high
+    bid = price * (1.0 - buy_sell_percent)
+    place = (state == IDLE) & (bid < max_bid_percent * highs[:, t - max_price_ticks + 1])
+    limit = np.where(place, bid, limit)
+    placed_at = np.where(place, t, placed_at)
+    state = np.where(place, BUYING, state)
+
+    equity[:, t - start] = cash + shares * price
+
+  return equity[:, -1] / begin_cash - 1.0, max_drawdowns(equity)
+
+def run_chunk(returns, n_paths, length, start_price, method, seed, strategy, params):
+  rng = np.random.default_rng(seed)
+  paths = generate_paths(returns, n_paths, length, start_price, method, rng)
+  return {
+    'ma_cross': sim_ma_paths(paths, strategy, params['begin_cash'], params['ticks']),
+    'bid_ask': sim_bid_ask_paths(paths, params['begin_cash'], params['ticks'], params['buy_sell_percent'], params['timeout_ticks']),
+  }
+
+def stress_test(history, n_paths, method, strategy, params, workers=None):
+  history = np.asarray(history, dtype=np.float64)
+  returns = np.diff(np.log(history))
+  seed = random.randrange(2**32)
+  chunks = [min(PATHS_PER_CHUNK, n_paths - i) for i in range(0, n_paths, PATHS_PER_CHUNK)]
+
+  with ProcessPoolExecutor(max_workers=workers) as pool:
+    futures = [
+      pool.submit(run_chunk, returns, n, len(history), history[0], method, seed + i, strategy, params)
+      for i, n in enumerate(chunks)
+    ]
+    results = [f.result() for f in futures]
+
+  return {
+    name: tuple(np.concatenate([r[name][k] for r in results]) for k in (0, 1))
+    for name in results[0]
+  }
+
+def print_distribution(name, returns, drawdowns):
+  q = [5, 25, 50, 75, 95]
+  print('=== {} over {} paths ==='.format(name, len(returns)))
+  print('return %   p5/p25/p50/p75/p95: {}'.format(' / '.join(str(round(x * 100.0, 2)) for x in np.percentile(returns, q))))
+  print('drawdown % p5/p25/p50/p75/p95: {}'.format(' / '.join(str(round(x * 100.0, 2)) for x in np.percentile(drawdowns, q))))
+  print('mean return {}%, P(loss) {}%'.format(round(np.mean(returns) * 100.0, 3), round(np.mean(returns < 0.0) * 100.0, 1)))
+
+
+def main(args=sys.argv):
+  locale.setlocale(locale.LC_ALL, '')
+  sec = str(os.environ['USE_SECURITY']) if 'USE_SECURITY' in os.environ else random.choice(robin_movavg.crypto_securities)
+  n_paths = int(os.environ['ROBIN_MC_PATHS']) if 'ROBIN_MC_PATHS' in os.environ else 10000
+  method = 'gbm' if 'gbm' in args else 'bootstrap'
+  buy_sell_percent = abs(float(os.environ['ROBIN_BS_PERCENT'])) if 'ROBIN_BS_PERCENT' in os.environ else 0.0051
+  timeout_seconds = abs(float(os.environ['ROBIN_TIMEOUT_SEC'])) if 'ROBIN_TIMEOUT_SEC' in os.environ else 22 * 60
+  params = {
+    'begin_cash': robin_movavg.BEGIN_CASH,
+    'ticks': robin_movavg.SIMULATION_TICKS,
+    'buy_sell_percent': buy_sell_percent,
+    'timeout_ticks': max(1, int(math.ceil(timeout_seconds / BAR_SECONDS))),
+  }
+  strategy = make_strategy(os.environ.get('ROBIN_STRATEGY', 'ma_cross'))
+
+  history = robin_movavg.get_crypto_history(sec)
+  print('Stress testing {} with {} {} paths of {} bars'.format(sec, n_paths, method, len(history)))
+  results = stress_test(history, n_paths, method, strategy, params)
+  for name, (returns, drawdowns) in results.items():
+    print_distribution(name, returns, drawdowns)
+
+
+if __name__ == '__main__':
+  main()
@@ -1,5 +1,5 @@
 
-# python -m pip install --user robin_stocks
+# python -m pip install --user robin_stocks numpy
 # https://robin-stocks.readthedocs.io/en/latest/robinhood.html
 from robin_stocks import robinhood
 
@@ -11,9 +11,17 @@ import time
 import pickle
 import json
 import signal
-import subprocess
 import locale
 
+from robin_ledger import Ledger, quiet_requested
+from robin_strategy import make_strategy, SIGNAL_NAMES, HOLD, BUY, SELL
+import robin_bars
+import robin_quotebus
+import robin_trace
+import robin_pairs
+import robin_dispatch
+import robin_orders
+
 # Create a persistable cache for music analysis data
 from functools import wraps
 def cached(cache_file):
@@ -64,17 +72,21 @@ def get_crypto_history_cached(sec, timestamp):
   return get_crypto_history(sec)
 
 def get_crypto_history(sec):
+  return [float(x['close_price']) for x in get_crypto_history_bars(sec)]
+
+# Same as get_crypto_history, but the full bar dicts (begins_at, open_price, ...)
+def get_crypto_history_bars(sec):
   while True:
     try:
       check_robin_login()
-      # https://robin-stocks.readthedocs.io/en/latest/robinhood.html#robin_stocks.robinhood.crypto.get_crypto_historicals
-      history_json = robinhood.crypto.get_crypto_historicals(
+      # Served from the local 5-minute bar store, see robin_bars.py
+      history_json = robin_bars.get_bars(
         sec, interval='5minute', span='week'
         #sec, interval='hour', span='month'
       )
       #print('history_json[0] = {}'.format(history_json[0]))
       #print('history_json[-1] = {}'.format(history_json[-1]))
-      return [float(x['close_price']) for x in history_json]
+      return history_json
     except Exception as e:
       print(e)
       time.sleep(1)
@@ -109,58 +121,59 @@ def moving_avg_6hr(history):
 def moving_avg_12hr(history):
   return moving_avg(history, slots=12*12)
 
-def sim_strat(sec, history, history_avg_long, history_avg_short):
-
-  def purchase_decision(history, history_avg_short, history_avg_long, i=-1):
-    if history[i] < history_avg_short[i]:
-      return 'buy b/c now:{} < short avg:{}'.format(history[i], history_avg_short[i])
-
-    if history[i] > history_avg_long[i]:
-      return 'sell b/c now:{} > long avg:{}'.format(history[i], history_avg_long[i])
-
-    return 'hold'
+def sim_strat(sec, history, strategy, ledger=None):
+  if ledger is None:
+    ledger = Ledger(mode='sim', quiet=quiet_requested())
 
+  # Every decision for the whole simulation in one pass
+  indicators = strategy.indicators(history)
+  signals = strategy.signals(history, indicators)
 
   cash = BEGIN_CASH
   shares = 0.0
   price_per_share = None
   last_buy_price = 0.0
   for i in range(-SIMULATION_TICKS, -1,1):
-    print('')
-    print('i={} cash={} shares={}'.format(i, cash, shares))
-    decision = purchase_decision(history, history_avg_short, history_avg_long, i)
-    print('purchase_decision({}) = {}'.format(i, purchase_decision(history, history_avg_short, history_avg_long, i)))
+    decision = signals[i]
+    ledger.say('')
+    ledger.say('i={} cash={} shares={}'.format(i, cash, shares))
+    ledger.say('signal({}) = {} {}'.format(i, SIGNAL_NAMES[decision], strategy.describe(history[i], indicators, i)))
     price_per_share = history[i]
-    if 'buy' in decision:
+    if decision == BUY:
       if cash > 1.00:
         new_shares = cash / price_per_share
-        print('BUY {} shares for {}'.format(new_shares, cash))
+        ledger.say('BUY {} shares for {}'.format(new_shares, cash))
+        ledger.record('fill', sec, ts=i, side='buy', price=price_per_share, quantity=new_shares, cash=0.0, shares=shares + new_shares)
         shares += new_shares
         cash = 0.0
         last_buy_price = price_per_share
       else:
-        print('CANNOT BUY; no cash')
+        ledger.say('CANNOT BUY; no cash')
     
-    elif 'sell' in decision:
+    elif decision == SELL:
       if shares > 0.0:
         if price_per_share > last_buy_price:
           new_cash = shares * price_per_share
-          print('SELL {} shares for {}'.format(shares, new_cash))
+          ledger.say('SELL {} shares for {}'.format(shares, new_cash))
+          ledger.record('fill', sec, ts=i, side='sell', price=price_per_share, quantity=shares, cash=cash + new_cash, shares=0.0,
+            pnl=(price_per_share - last_buy_price) * shares)
           cash += new_cash
           shares = 0.0
         else:
-          print('REFUSED SELL; current price {} is < last_buy_price {}'.format(price_per_share, last_buy_price))
+          ledger.say('REFUSED SELL; current price {} is < last_buy_price {}'.format(price_per_share, last_buy_price))
       else:
-        print('CANNOT SELL; no shares')
+        ledger.say('CANNOT SELL; no shares')
 
     else:
-      print('HOLDING')
+      ledger.say('HOLDING')
 
   # sell all at end if we hold shares
   if shares > 0.0:
     cash = shares * price_per_share
     shares = 0.0
   sim_hours = SIMULATION_TICKS / 12
+  ledger.record('pnl', sec, ts=-1, price=price_per_share, cash=cash, shares=shares, pnl=cash - BEGIN_CASH)
+  ledger.flush()
 
   print('')
   print('{}-hr trade sim of {} with cash={} ({}% gain)'.format(round(sim_hours, 1), sec, round(cash, 4), round(((cash-BEGIN_CASH)/BEGIN_CASH)*100.0,2)  ))
@@ -182,18 +195,10 @@ def printable(obj):
 
 def on_exit(sig, frame):
   global active_buy_order_id
-  
-  print('CANCELLING BUY ORDER (ctrl+c)')
-  order_state = 'unk'
-  while active_buy_order_id and order_state != 'canceled':
-    print('.', end='', flush=True)
-    order_status = robinhood.orders.cancel_crypto_order(active_buy_order_id)
-    if 'state' in order_status:
-      order_state = order_status['state'].lower().strip()
-    elif 'Order cannot be canceled at this time' in printable(order_status):
-      break;
-    else:
-      print('order_status={}'.format(printable(order_status)))
+
+  # Open buy + sell orders of this worker (and of dead workers), cancelled concurrently
+  print('CANCELLING BOT ORDERS (ctrl+c)')
+  robin_orders.cancel_all_bot_orders()
 
   sys.exit(0)
 
@@ -201,49 +206,52 @@ SIMULATION_TICKS = 12*120
 BEGIN_CASH = 50.0
 active_buy_order_id = None
 
+crypto_securities = [
+  #'LTC', 'ETC', 'ETH', 'BCH', 'BSV', 'BTC',
+  'LTC', 'ETC', 'ETH', 'BCH', 'BSV', 'BTC',
+  #'ETC'
+]
+
 def main(args=sys.argv):
   global active_buy_order_id
   locale.setlocale(locale.LC_ALL, '')
-  crypto_securities = [
-    #'LTC', 'ETC', 'ETH', 'BCH', 'BSV', 'BTC',
-    'LTC', 'ETC', 'ETH', 'BCH', 'BSV', 'BTC',
-    #'ETC'
-  ]
   #sec = random.choice(crypto_securities)
   sec = str(os.environ['USE_SECURITY']) if 'USE_SECURITY' in os.environ else random.choice(crypto_securities)
   history = get_crypto_history(sec)
 
-  history_avg_long = moving_avg_6hr(history)
-  #history_avg_long = moving_avg_12hr(history)
-  history_avg_short = moving_avg_1hr(history)
+  # 1hr short / 6hr long averages by default, see robin_strategy.py
+  strategy = make_strategy(os.environ.get('ROBIN_STRATEGY', 'ma_cross'))
 
   if 'sim' in args:
-    sim_strat(sec, history, history_avg_long, history_avg_short)
+    sim_strat(sec, history, strategy)
     return
 
   # Actually begin buying using sim_simplest strategy
   check_robin_login()
+  ledger = Ledger(mode='live', quiet=quiet_requested(args))
   signal.signal(signal.SIGINT, on_exit)
 
-  def purchase_decision(history, history_avg_short, history_avg_long, i=-1):
-    if history[i] < history_avg_short[i]:
-      return 'buy b/c now:{} < short avg:{}'.format( history[i], round(history_avg_short[i], 4) )
-
-    if history[i] > history_avg_long[i]:
-      return 'sell b/c now:{} > long avg:{}'.format( history[i], round(history_avg_long[i], 4) )
-
-    return 'hold'
-
-  def do_buy(cash, buy_sec, buy_price, buy_quantity, timeout_seconds=800):
+  # quote is the (bid, ask) the decision was made on, for robin_trace.py
+  def do_buy(cash, buy_sec, buy_price, buy_quantity, timeout_seconds=800, quote=None):
     global active_buy_order_id
     # returns shares, cash
+    bid, ask = quote or (buy_price, buy_price)
+    trace = robin_trace.OrderTrace(buy_sec, 'buy', bid=bid, ask=ask)
+    buy_price = robin_pairs.round_price(buy_sec, buy_price, 'buy')
+    buy_quantity = robin_pairs.round_quantity(buy_sec, buy_quantity)
+    if buy_quantity <= 0.0:
+      print('CANNOT BUY; below minimum order size')
+      return 0.0, cash
+
     active_order_id = None
     while not active_order_id:
+      trace.submit()
       order = robinhood.orders.order_buy_crypto_limit(
         buy_sec, buy_quantity, buy_price,
         timeInForce='gtc',
       )
       if 'Order quantity has invalid increment' in printable(order) or 'Ensure that there are no more than' in printable(order):
+        trace.retry('increment')
         buy_quantity = float(str(buy_quantity)[:-1])
         print('WARN: reduced buy_quantity={}'.format(buy_quantity))
         time.sleep(0.5)
@@ -255,9 +263,12 @@ def main(args=sys.argv):
       # Contains an "id", "ref_id", 
 
       active_order_id = order['id']
+      robin_orders.remember_order(active_order_id)
+    trace.submitted(active_order_id, buy_price, buy_quantity)
 
     # Wait for order to be filled
     active_buy_order_id = active_order_id
+    ledger.record('order', buy_sec, side='buy', price=buy_price, quantity=buy_quantity, cash=cash, order_id=active_order_id)
     print('Waiting for {} buy order {} to be filled'.format(buy_sec, active_order_id), end='', flush=True)
     order_state = 'confirmed'
     order_status = None
@@ -265,7 +276,7 @@ def main(args=sys.argv):
     cancel_buy = False
     poll_seconds = 15
     while order_state != 'filled' and order_state != 'canceled':
-      print('.', end='', flush=True)
+      ledger.say('.', end='', flush=True)
       if polled_seconds >= timeout_seconds:
         cancel_buy = True
         break
@@ -276,11 +287,12 @@ def main(args=sys.argv):
       order_status = robinhood.orders.get_crypto_order_info(active_order_id)
       # print('order_status={}'.format(printable(order_status)))
       order_state = order_status['state'].lower().strip()
+      trace.state(order_state)
     print('')
 
-    if cancel_buy:
+    # Cancelled by something else (eg robin.py status) counts as a timeout too
+    if cancel_buy or order_state == 'canceled':
       print('CANCELLING BUY ORDER (timout after {} seconds)'.format(polled_seconds))
-      order_state = 'unk'
       while order_state != 'canceled':
         print('.', end='', flush=True)
         order_status = robinhood.orders.cancel_crypto_order(active_order_id)
@@ -292,22 +304,39 @@ def main(args=sys.argv):
           print('order_status={}'.format(printable(order_status)))
 
       # Buy timed out, return NO shares and beginning cash
+      robin_orders.forget_order(active_order_id)
+      trace.finish('canceled')
+      ledger.record('cancel', buy_sec, side='buy', price=buy_price, quantity=buy_quantity, order_id=active_order_id, elapsed_s=polled_seconds)
       return 0.0, cash
     else:
 
       # Buy executed, return ALL shares and NO cash
+      robin_orders.forget_order(active_order_id)
+      trace.finish(order_state, order_status.get('average_price') or buy_price, buy_quantity)
+      ledger.record('fill', buy_sec, side='buy', price=buy_price, quantity=buy_quantity, cash=0.0, shares=buy_quantity,
+        order_id=active_order_id, elapsed_s=polled_seconds)
       return buy_quantity, 0.0
 
 
-  def do_sell(cash, sell_sec, sell_price, sell_quantity):
+  def do_sell(cash, sell_sec, sell_price, sell_quantity, quote=None):
     # returns shares, cash
+    bid, ask = quote or (sell_price, sell_price)
+    trace = robin_trace.OrderTrace(sell_sec, 'sell', bid=bid, ask=ask)
+    sell_price = robin_pairs.round_price(sell_sec, sell_price, 'sell')
+    if robin_pairs.round_quantity(sell_sec, sell_quantity) <= 0.0:
+      print('CANNOT SELL; below minimum order size')
+      return sell_quantity, cash
+    sell_quantity = robin_pairs.round_quantity(sell_sec, sell_quantity)
+
     active_order_id = None
     while not active_order_id:
+      trace.submit()
       order = robinhood.orders.order_sell_crypto_limit(
         sell_sec, sell_quantity, sell_price,
         timeInForce='gtc',
       )
       if 'Insufficient holdings.' in printable(order):
+        trace.retry('insufficient_holdings')
         print('!', end='', flush=True)
         time.sleep(5)
         continue
@@ -315,11 +344,13 @@ def main(args=sys.argv):
       if not 'id' in order:
 
         if 'Order quantity has invalid increment' in printable(order) or 'there are no more than' in printable(order):
+          trace.retry('increment')
           sell_quantity = float(str(sell_quantity)[:-1])
           print('WARN: reduced sell_quantity={}'.format(sell_quantity))
           time.sleep(0.5)
 
         else:
+          trace.retry('rejected')
           print('WARN: order={}'.format(printable(order)))
           time.sleep(2)
 
@@ -328,15 +359,18 @@ def main(args=sys.argv):
       # Contains an "id", "ref_id", 
 
       active_order_id = order['id']
+      robin_orders.remember_order(active_order_id)
+    trace.submitted(active_order_id, sell_price, sell_quantity)
 
     # Wait for order to be filled
+    ledger.record('order', sell_sec, side='sell', price=sell_price, quantity=sell_quantity, cash=cash, order_id=active_order_id)
     print('Waiting for {} sell order {} to be filled'.format(sell_sec, active_order_id), end='', flush=True)
     order_state = 'confirmed'
     order_status = None
     polled_seconds = 0
     poll_seconds = 15
     while order_state != 'filled' and order_state != 'canceled':
-      print('.', end='', flush=True)
+      ledger.say('.', end='', flush=True)
 
       time.sleep(poll_seconds)
       polled_seconds += poll_seconds
@@ -344,9 +378,23 @@ def main(args=sys.argv):
       order_status = robinhood.orders.get_crypto_order_info(active_order_id)
       # print('order_status={}'.format(printable(order_status)))
       order_state = order_status['state'].lower().strip()
+      trace.state(order_state)
     print('')
 
+    if order_state == 'canceled':
+      # Cancelled by something else, still holding ALL shares
+      print('SELL ORDER CANCELED')
+      robin_orders.forget_order(active_order_id)
+      trace.finish('canceled')
+      ledger.record('cancel', sell_sec, side='sell', price=sell_price, quantity=sell_quantity, order_id=active_order_id,
+        elapsed_s=polled_seconds, note='external')
+      return sell_quantity, cash
+
     # Sell completed, return NO shares and ALL cash
+    robin_orders.forget_order(active_order_id)
+    trace.finish(order_state, order_status.get('average_price') or sell_price, sell_quantity)
+    ledger.record('fill', sell_sec, side='sell', price=sell_price, quantity=sell_quantity, cash=sell_quantity * sell_price, shares=0.0,
+      order_id=active_order_id, elapsed_s=polled_seconds)
     return 0.0, sell_quantity * sell_price
 
   begin_cash = float(os.environ['ROBIN_SPEC_CASH']) if 'ROBIN_SPEC_CASH' in os.environ else 50.0
@@ -354,49 +402,94 @@ def main(args=sys.argv):
   shares = 0.0
   print('sec={} cash={}'.format(sec, cash))
 
+  # 'intrabar' keeps the averages from the 5-minute bars, but evaluates the
+  # rule against live quotes every ROBIN_INTRABAR_POLL_SEC: buys against the
+  # ask, sells against the bid. History is only refetched once a new bar is
+  # due, and a quote identical to the last one evaluated is skipped.
+  intrabar = 'intrabar' in args
+  intrabar_poll_seconds = float(os.environ['ROBIN_INTRABAR_POLL_SEC']) if 'ROBIN_INTRABAR_POLL_SEC' in os.environ else 10.0
+  bar_seconds = robin_bars.INTERVAL_SECONDS['5minute']
+  next_bar_at = 0.0
+  last_quote = None
+
   while True:
-    # Query new data
-    history = get_crypto_history(sec)
-    history_avg_long = moving_avg_6hr(history)
-    history_avg_short = moving_avg_1hr(history)
+    new_bar = not intrabar or time.time() >= next_bar_at
+    if new_bar:
+      # Query new data
+      history = get_crypto_history(sec)
+      indicators = strategy.indicators(history)
+      # Give the API a few seconds to publish the bar once it closes
+      next_bar_at = (time.time() // bar_seconds + 1) * bar_seconds + 10
+      last_quote = None
+
+    if intrabar:
+      q = robin_quotebus.get_crypto_quote(sec)
+      bid_price = float(q['bid_price'])
+      ask_price = float(q['ask_price'])
+      if (bid_price, ask_price) == last_quote:
+        time.sleep(intrabar_poll_seconds)
+        continue
+      last_quote = (bid_price, ask_price)
 
-    print('')
-    print('cash={} shares={}'.format(cash, shares))
-    decision = purchase_decision(history, history_avg_short, history_avg_long)
-    print('decision = {}'.format(decision))
-    price_per_share = round(history[-1], 2)
-    if 'buy' in decision:
+      if strategy.decide(ask_price, indicators) == BUY:
+        decision, price = BUY, ask_price
+      elif strategy.decide(bid_price, indicators) == SELL:
+        decision, price = SELL, bid_price
+      else:
+        decision, price = HOLD, (bid_price + ask_price) / 2.0
+      reason = '{} bid:{} ask:{}'.format(strategy.describe(price, indicators), bid_price, ask_price)
+      decision_quote = (bid_price, ask_price)
+    else:
+      decision = strategy.signals(history, indicators)[-1]
+      price = history[-1]
+      reason = strategy.describe(price, indicators)
+      decision_quote = (price, price)
+
+    ledger.say('')
+    ledger.say('cash={} shares={}'.format(cash, shares))
+    ledger.say('decision = {} {}'.format(SIGNAL_NAMES[decision], reason))
+    price_per_share = round(price, 2)
+    ledger.record('decision', sec, side=SIGNAL_NAMES[decision], price=price_per_share, cash=cash, shares=shares, note=reason)
+    if decision == BUY:
       if cash > 1.00:
         new_shares = cash / price_per_share
         print('BUY {} shares for {}'.format(new_shares, cash))
-        shares, cash = do_buy(cash, sec, price_per_share, new_shares)
+        shares, cash = do_buy(cash, sec, price_per_share, new_shares, quote=decision_quote)
+        # Orders block for a while, the next quote is always evaluated
+        last_quote = None
       else:
         print('CANNOT BUY; no cash')
     
-    elif 'sell' in decision:
-      shares = get_free_shares(sec)
+    elif decision == SELL:
+      # Intrabar, only the first evaluation of a bar looks for shares bought outside this loop
+      if new_bar or shares > 0.0:
+        shares = get_free_shares(sec)
       if shares > 0.0:
         new_cash = shares * price_per_share
         print('SELL {} shares for {}'.format(shares, new_cash))
-        shares, cash = do_sell(cash, sec, price_per_share, shares)
+        shares, cash = do_sell(cash, sec, price_per_share, shares, quote=decision_quote)
+        last_quote = None
+        if shares <= 0.0:
+          ledger.record('pnl', sec, cash=cash, shares=shares, pnl=cash - begin_cash)
 
-        subprocess.run([
-          '/j/bin/ding',
-          '{} {} ({})'.format(
+          robin_dispatch.notify('{} {} ({})'.format(
             sec,
             locale.currency(cash),
             locale.currency(cash - begin_cash)
-          )
-        ])
+          ))
 
       else:
         print('CANNOT SELL; no shares')
 
     else:
-      print('HOLDING')
+      ledger.say('HOLDING')
 
-    # Wait 5 mins
-    time.sleep(300)
+    robin_dispatch.call(ledger.flush, key='ledger')
+    if intrabar:
+      time.sleep(intrabar_poll_seconds)
+    else:
+      # Wait 5 mins
+      time.sleep(300)
 
 
 
@@ -0,0 +1,173 @@
+
+# Book-keeping of which open orders belong to the bot and a fast way to
+# cancel all of them on shutdown.
+#
+# Every order robin.py / robin_movavg.py places is appended to
+# /tmp/.robin_owned_orders as "<pid> <order id>", so any worker on the host
+# can find orders placed by the others. Updates hold an flock on
+# /tmp/.robin_owned_orders.lock since several workers share the file.
+#
+# ROBIN_CANCEL_DEADLINE_SEC=2.0 # give up cancelling after this long
+# ROBIN_CANCEL_SCOPE=self # this process + workers that died, or 'all' bot orders on this host
+
+# python -m pip install --user robin_stocks
+from robin_stocks import robinhood
+
+import os
+import sys
+import time
+import fcntl
+import random
+import threading
+from contextlib import contextmanager
+
+OWNED_ORDERS_FILE = '/tmp/.robin_owned_orders'
+CANCEL_RETRIES = 3
+
+# flock conflicts between two fds of the same process, so the lock is held
+# once per process and nested users (eg on_exit interrupting remember_order
+# on the same thread) just count depth instead of blocking forever.
+owned_lock = threading.RLock()
+owned_lock_depth = 0
+owned_lock_fd = None
+
+@contextmanager
+def owned_orders_lock():
+  global owned_lock_depth, owned_lock_fd
+  with owned_lock:
+    if owned_lock_depth == 0:
+      owned_lock_fd = open(OWNED_ORDERS_FILE + '.lock', 'a')
+      owned_lock_depth += 1
+      fcntl.flock(owned_lock_fd, fcntl.LOCK_EX)
+    else:
+      owned_lock_depth += 1
+    try:
+      yield
+    finally:
+      owned_lock_depth -= 1
+      if owned_lock_depth == 0:
+        fcntl.flock(owned_lock_fd, fcntl.LOCK_UN)
+        owned_lock_fd.close()
+        owned_lock_fd = None
+
+def remember_order(order_id):
+  with owned_orders_lock():
+    with open(OWNED_ORDERS_FILE, 'a') as fd:
+      fd.write('{} {}\n'.format(os.getpid(), order_id))
+
+def owned_orders():
+  # returns {order id: pid that placed it}
+  owned = {}
+  if os.path.exists(OWNED_ORDERS_FILE):
+    with open(OWNED_ORDERS_FILE, 'r') as fd:
+      for line in fd:
+        parts = line.split()
+        if len(parts) == 2:
+          owned[parts[1]] = int(parts[0])
+  return owned
+
+def forget_orders(order_ids):
+  order_ids = set(order_ids)
+  if not order_ids:
+    return
+  with owned_orders_lock():
+    if not os.path.exists(OWNED_ORDERS_FILE):
+      return
+    with open(OWNED_ORDERS_FILE, 'r') as fd:
+      lines = [l for l in fd if len(l.split()) == 2 and l.split()[1] not in order_ids]
+    tmp = '{}.{}.tmp'.format(OWNED_ORDERS_FILE, os.getpid())
+    with open(tmp, 'w') as fd:
+      fd.write(''.join(lines))
+    os.replace(tmp, OWNED_ORDERS_FILE)
+
+def forget_order(order_id):
+  forget_orders([order_id])
+
+def pid_alive(pid):
+  try:
+    os.kill(pid, 0)
+  except ProcessLookupError:
+    return False
+  except PermissionError:
+    return True
+  return True
+
+
+# Cancel one order, retrying until it is canceled/filled, retries run out or
+# the deadline passes. Returns the final state as a string.
+def cancel_one(order_id, deadline, retries=CANCEL_RETRIES):
+  state = 'unk'
+  for attempt in range(retries):
+    if time.time() >= deadline:
+      return 'timeout'
+    try:
+      order_status = robinhood.orders.cancel_crypto_order(order_id)
+      if 'state' in order_status:
+        state = order_status['state'].lower().strip()
+      else:
+        # Either already done or mid-transition, ask what it is now
+        state = robinhood.orders.get_crypto_order_info(order_id)['state'].lower().strip()
+    except Exception as e:
+      state = 'error: {}'.format(e)
+    if state in ('canceled', 'filled', 'rejected', 'failed'):
+      return state
+  return state
+
+# Cancel every order in order_ids concurrently. Returns {order id: final state};
+# orders still in flight at the deadline are reported as 'timeout'.
+def cancel_orders(order_ids, deadline_seconds=2.0):
+  deadline = time.time() + deadline_seconds
+  results = {order_id: 'timeout' for order_id in order_ids}
+
+  def worker(order_id):
+    results[order_id] = cancel_one(order_id, deadline)
+
+  # Daemon threads, so a hung request can't hold up process exit
+  threads = [threading.Thread(target=worker, args=(order_id,), daemon=True) for order_id in order_ids]
+  for t in threads:
+    t.start()
+  for t in threads:
+    t.join(max(0.0, deadline - time.time()))
+  return dict(results)
+
+def cancel_all_bot_orders(deadline_seconds=None, scope=None):
+  if deadline_seconds is None:
+    deadline_seconds = float(os.environ['ROBIN_CANCEL_DEADLINE_SEC']) if 'ROBIN_CANCEL_DEADLINE_SEC' in os.environ else 2.0
+  if scope is None:
+    scope = os.environ.get('ROBIN_CANCEL_SCOPE', 'self')
+
+  owned = owned_orders()
+  if scope != 'all':
+    # Other running workers are still watching their own orders
+    owned = {order_id: pid for order_id, pid in owned.items() if pid == os.getpid() or not pid_alive(pid)}
+  if not owned:
+    return {}
+
+  # Straight to cancelling, listing open orders would page with no deadline;
+  # orders that already filled or were cancelled just report that state
+  results = cancel_orders(list(owned), deadline_seconds)
+  forget_orders([order_id for order_id, state in results.items() if state in ('canceled', 'filled', 'rejected', 'failed')])
+
+  for order_id, state in sorted(results.items(), key=lambda x: x[1]):
+    print('{} {}'.format(order_id, state))
+  cancelled = len([s for s in results.values() if s == 'canceled'])
+  print('Cancelled {} of {} bot orders'.format(cancelled, len(results)))
+  return results
+
+
+if __name__ == '__main__':
+  # python robin_orders.py [cancel] - list (or cancel) open orders the bot owns
+  # Ensure generate_device_token always gives
+  # the same machine name.
+  random.seed(a="123", version=2)
+  login = robinhood.login(
+    'email@example.com',
+    'some-pw-or-token',
+  )
+  random.seed(a=str(time.time()), version=2)
+
+  if 'cancel' in sys.argv:
+    cancel_all_bot_orders(scope='all')
+  else:
+    for order_id, pid in owned_orders().items():
+      print('{} placed by pid {}'.format(order_id, pid))
@@ -0,0 +1,92 @@
+
+# Cached crypto currency pair metadata (quantity/price increments, min/max sizes)
+# so order quantities and limit prices are valid before they are submitted.
+# The pairs endpoint is hit at most once every PAIRS_REFRESH_SECONDS per host.
+
+# python -m pip install --user robin_stocks
+from robin_stocks import robinhood
+
+import os
+import json
+import time
+from decimal import Decimal, ROUND_FLOOR, ROUND_CEILING
+
+PAIRS_FILE = '/tmp/.robin_pairs.json'
+PAIRS_REFRESH_SECONDS = 6 * 60 * 60
+# After a failed refresh the cached pairs are used for this long before trying again
+PAIRS_RETRY_SECONDS = 5 * 60
+
+pairs = None
+pairs_fetched_at = 0.0
+pairs_retry_at = 0.0
+
+def refresh():
+  global pairs
+  global pairs_fetched_at
+  # https://robin-stocks.readthedocs.io/en/latest/robinhood.html#robin_stocks.robinhood.crypto.get_crypto_currency_pairs
+  fetched = robinhood.crypto.get_crypto_currency_pairs()
+  pairs = {p['asset_currency']['code']: p for p in fetched if 'asset_currency' in p}
+  pairs_fetched_at = time.time()
+  # Other workers read the file, so they only ever see a complete one
+  tmp = '{}.{}.tmp'.format(PAIRS_FILE, os.getpid())
+  with open(tmp, 'w') as fd:
+    json.dump({'fetched_at': pairs_fetched_at, 'pairs': pairs}, fd)
+  os.replace(tmp, PAIRS_FILE)
+
+def load():
+  global pairs
+  global pairs_fetched_at
+  global pairs_retry_at
+  if pairs is None and os.path.exists(PAIRS_FILE):
+    try:
+      with open(PAIRS_FILE, 'r') as fd:
+        cached = json.load(fd)
+      pairs = cached['pairs']
+      pairs_fetched_at = cached['fetched_at']
+    except Exception as e:
+      print('WARN: ignoring {}: {}'.format(PAIRS_FILE, e))
+  now = time.time()
+  if (pairs is None or now - pairs_fetched_at > PAIRS_REFRESH_SECONDS) and now >= pairs_retry_at:
+    try:
+      refresh()
+    except Exception as e:
+      # Stale increments beat killing the order path; rounding falls back to
+      # passing values through when there is nothing cached at all
+      pairs_retry_at = now + PAIRS_RETRY_SECONDS
+      print('WARN: refreshing crypto pairs failed, using {}: {}'.format('cached pairs' if pairs else 'none', e))
+  return pairs or {}
+
+def get_pair(sec):
+  return load().get(sec)
+
+# eg '3d432c4b-...' -> 'BTC', saves a get_crypto_quote_from_id() round trip
+def symbol_for_pair_id(pair_id):
+  for code, p in load().items():
+    if p['id'] == pair_id:
+      return code
+  return None
+
+def round_to_increment(value, increment, rounding):
+  increment = Decimal(str(increment))
+  steps = (Decimal(str(value)) / increment).to_integral_value(rounding=rounding)
+  return float(steps * increment)
+
+# Quantity rounded down to the pair's increment and capped at its max order size.
+# Returns 0.0 if that leaves less than the minimum order size.
+def round_quantity(sec, quantity):
+  p = get_pair(sec)
+  if p is None:
+    return quantity
+  quantity = round_to_increment(quantity, p['min_order_quantity_increment'], ROUND_FLOOR)
+  quantity = min(quantity, float(p['max_order_size']))
+  if quantity < float(p['min_order_size']):
+    return 0.0
+  return quantity
+
+# Buys round down and sells round up, so rounding never makes a limit worse for us
+def round_price(sec, price, side='buy'):
+  p = get_pair(sec)
+  if p is None:
+    return round(price, 2)
+  rounding = ROUND_FLOOR if side == 'buy' else ROUND_CEILING
+  return round_to_increment(price, p['min_order_price_increment'], rounding)
@@ -0,0 +1,172 @@
+
+# Realized P&L from the full crypto order history instead of the single
+# /tmp/.robin_total_profit_usd float.
+#
+# python robin_pnl.py [day]
+#
+# Orders are mirrored into /tmp/.robin_orders.json. The first run pages
+# through the whole history, later runs stop paging once they reach orders
+# that were already stored in a final state. Executed quantities of buys and
+# sells (including partial fills of canceled or still open orders) are
+# matched first-in-first-out per security, then realized P&L, win rate and
+# holding time are aggregated per security (and per day with 'day').
+
+# python -m pip install --user robin_stocks numpy
+from robin_stocks import robinhood
+from robin_stocks.robinhood.helper import request_get
+from robin_stocks.robinhood.urls import order_crypto_url
+
+import os
+import sys
+import json
+import time
+import random
+import locale
+from datetime import datetime
+
+import numpy as np
+
+import robin_pairs
+
+ORDERS_FILE = '/tmp/.robin_orders.json'
+FINAL_STATES = ('filled', 'canceled', 'rejected', 'failed')
+
+def load_orders():
+  if not os.path.exists(ORDERS_FILE):
+    return {}
+  with open(ORDERS_FILE, 'r') as fd:
+    return json.load(fd)
+
+def save_orders(orders):
+  tmp = ORDERS_FILE + '.tmp'
+  with open(tmp, 'w') as fd:
+    json.dump(orders, fd)
+  os.replace(tmp, ORDERS_FILE)
+
+# Orders created before this are stored in a final state and won't change:
+# the oldest stored order still open, or else the newest stored order.
+def sync_marker(orders):
+  open_created = [o['created_at'] for o in orders.values() if not o['state'] in FINAL_STATES]
+  if open_created:
+    return min(open_created)
+  return max([o['created_at'] for o in orders.values()], default='')
+
+# Pull orders newer than the sync marker (pages are newest first)
+def sync_orders(orders):
+  marker = sync_marker(orders)
+  url = order_crypto_url()
+  fetched = 0
+  while url:
+    page = request_get(url, 'regular')
+    if not page or not 'results' in page:
+      break
+    reached_marker = False
+    for o in page['results']:
+      if marker and o['created_at'] < marker:
+        reached_marker = True
+        continue
+      orders[o['id']] = o
+      fetched += 1
+    if reached_marker:
+      break
+    url = page.get('next')
+  save_orders(orders)
+  return fetched
+
+def parse_time(ts):
+  return datetime.fromisoformat(ts.replace('Z', '+00:00')).timestamp()
+
+# FIFO match fills, one entry per (sell, buy lot) pair:
+# returns columns sec, day, pnl, holding_seconds, quantity
+def realized_trades(orders):
+  fills = {}
+  for o in orders.values():
+    # cumulative_quantity is what actually executed, which a canceled order
+    # that was partially filled has too
+    if 'cumulative_quantity' in o:
+      quantity = float(o['cumulative_quantity'] or 0.0)
+    else:
+      quantity = float(o['quantity']) if o['state'] == 'filled' else 0.0
+    if quantity <= 0.0:
+      continue
+    sec = robin_pairs.symbol_for_pair_id(o['currency_pair_id']) or o['currency_pair_id']
+    price = float(o.get('average_price') or o['price'])
+    when = parse_time(o.get('last_transaction_at') or o['updated_at'])
+    fills.setdefault(sec, []).append((when, o['side'], quantity, price))
+
+  trades = {'sec': [], 'day': [], 'pnl': [], 'holding_seconds': [], 'quantity': []}
+  for sec, sec_fills in fills.items():
+    lots = [] # [when, quantity remaining, price]
+    for when, side, quantity, price in sorted(sec_fills):
+      if side == 'buy':
+        lots.append([when, quantity, price])
+        continue
+      while quantity > 1e-12 and lots:
+        lot = lots[0]
+        matched = min(quantity, lot[1])
+        trades['sec'].append(sec)
+        trades['day'].append(datetime.fromtimestamp(when).strftime('%Y-%m-%d'))
+        trades['pnl'].append((price - lot[2]) * matched)
+        trades['holding_seconds'].append(when - lot[0])
+        trades['quantity'].append(matched)
+        quantity -= matched
+        lot[1] -= matched
+        if lot[1] <= 1e-12:
+          lots.pop(0)
+
+  trades['pnl'] = np.array(trades['pnl'])
+  trades['holding_seconds'] = np.array(trades['holding_seconds'])
+  trades['quantity'] = np.array(trades['quantity'])
+  return trades
+
+# Group realized trades by a key column -> {key: (pnl, trades, win rate, mean holding hours)}
+def aggregate(trades, key):
+  keys, group = np.unique(np.array(trades[key], dtype=str), return_inverse=True)
+  n = len(keys)
+  pnl = np.bincount(group, weights=trades['pnl'], minlength=n)
+  count = np.bincount(group, minlength=n)
+  wins = np.bincount(group, weights=(trades['pnl'] > 0.0).astype(np.float64), minlength=n)
+  qty = np.bincount(group, weights=trades['quantity'], minlength=n)
+  held = np.bincount(group, weights=trades['holding_seconds'] * trades['quantity'], minlength=n)
+  return {
+    k: (pnl[i], int(count[i]), wins[i] / count[i], (held[i] / qty[i]) / 3600.0 if qty[i] > 0 else 0.0)
+    for i, k in enumerate(keys)
+  }
+
+def print_report(title, rows):
+  print('=== {} ==='.format(title))
+  print('{:<10} {:>12} {:>7} {:>6} {:>9}'.format('', 'realized', 'trades', 'win%', 'held(h)'))
+  for k, (pnl, count, win_rate, hours) in sorted(rows.items()):
+    print('{:<10} {:>12} {:>7} {:>6} {:>9}'.format(k, locale.currency(pnl), count, round(win_rate * 100.0, 1), round(hours, 1)))
+
+
+def main(args=sys.argv):
+  locale.setlocale(locale.LC_ALL, '')
+
+  # Ensure generate_device_token always gives
+  # the same machine name.
+  # https://github.com/jmfernandes/robin_stocks/blob/master/robin_stocks/robinhood/authentication.py
+  random.seed(a="123", version=2)
+  login = robinhood.login(
+    'email@example.com',
+    'some-pw-or-token',
+  )
+  random.seed(a=str(time.time()), version=2)
+
+  orders = load_orders()
+  fetched = sync_orders(orders)
+  print('Synced {} orders ({} stored)'.format(fetched, len(orders)))
+
+  trades = realized_trades(orders)
+  if len(trades['pnl']) < 1:
+    print('No realized trades yet')
+    return
+
+  print_report('per security', aggregate(trades, 'sec'))
+  if 'day' in args:
+    print_report('per day', aggregate(trades, 'day'))
+  print('Total realized: {}'.format(locale.currency(float(np.sum(trades['pnl'])))))
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,128 @@
+
+# Backtest a strategy over every security in robin_movavg.crypto_securities at once,
+# with one shared pool of cash instead of BEGIN_CASH per security.
+#
+# python robin_portfolio.py [quiet]
+#
+# ROBIN_SPEC_CASH=50.0 # total cash split across all securities
+# ROBIN_STRATEGY=ma_cross # see robin_strategy.py
+
+import os
+import sys
+import locale
+from concurrent.futures import ThreadPoolExecutor
+
+# python -m pip install --user numpy
+import numpy as np
+
+import robin_movavg
+import robin_bars
+from robin_ledger import Ledger, quiet_requested
+from robin_strategy import make_strategy, BUY, SELL
+
+# Returns (timestamps, prices) where prices[t, s] is the close of securities[s] at timestamps[t].
+# Only bars every security has a close for are kept.
+def aligned_history(securities, fetch=robin_movavg.get_crypto_history_bars):
+  robin_movavg.check_robin_login()
+  with ThreadPoolExecutor(max_workers=len(securities)) as pool:
+    all_bars = list(pool.map(fetch, securities))
+
+  closes = [{b['begins_at']: float(b['close_price']) for b in bars} for bars in all_bars]
+  common = set(closes[0])
+  for c in closes[1:]:
+    common &= set(c)
+  timestamps = sorted(common)
+
+  prices = np.array([[c[ts] for c in closes] for ts in timestamps], dtype=np.float64).reshape(len(timestamps), len(securities))
+  return timestamps, prices
+
+# Signal codes shaped like prices, one column per security
+def portfolio_signals(strategy, prices):
+  with ThreadPoolExecutor(max_workers=prices.shape[1]) as pool:
+    columns = list(pool.map(lambda s: strategy.signals(prices[:, s]), range(prices.shape[1])))
+  return np.stack(columns, axis=1)
+
+# Walk the aligned timeline with one cash balance. Sells are processed before
+# buys each tick so freed cash can be reused; each buy spends at most an equal
+# share of the starting cash so one security cannot take the whole book.
+# Returns (equity curve, realized P&L per security, trades per security).
+def simulate_portfolio(securities, timestamps, prices, signals, begin_cash, ticks=None, ledger=None):
+  n_ticks, n_secs = prices.shape
+  start = 0 if ticks is None else max(0, n_ticks - ticks)
+  slot_cash = begin_cash / n_secs
+
+  cash = begin_cash
+  shares = np.zeros(n_secs)
+  last_buy_price = np.zeros(n_secs)
+  realized = np.zeros(n_secs)
+  trades = np.zeros(n_secs, dtype=np.int64)
+  equity = np.empty(n_ticks - start)
+
+  for t in range(start, n_ticks):
+    price = prices[t]
+    sig = signals[t]
+
+    for s in np.flatnonzero((sig == SELL) & (shares > 0.0) & (price > last_buy_price)):
+      new_cash = shares[s] * price[s]
+      pnl = (price[s] - last_buy_price[s]) * shares[s]
+      if ledger:
+        ledger.record('fill', securities[s], ts=robin_bars.parse_ts(timestamps[t]), side='sell', price=price[s], quantity=shares[s],
+          cash=cash + new_cash, shares=0.0, pnl=pnl)
+      cash += new_cash
+      realized[s] += pnl
+      trades[s] += 1
+      shares[s] = 0.0
+
+    for s in np.flatnonzero((sig == BUY) & (shares == 0.0)):
+      spend = min(cash, slot_cash)
+      if spend <= 1.00:
+        break
+      shares[s] = spend / price[s]
+      last_buy_price[s] = price[s]
+      cash -= spend
+      trades[s] += 1
+      if ledger:
+        ledger.record('fill', securities[s], ts=robin_bars.parse_ts(timestamps[t]), side='buy', price=price[s], quantity=shares[s],
+          cash=cash, shares=shares[s])
+
+    equity[t - start] = cash + np.dot(shares, price)
+
+  return equity, realized, trades
+
+def max_drawdown(equity):
+  peaks = np.maximum.accumulate(equity)
+  return float(np.max(1.0 - equity / peaks)) if len(equity) else 0.0
+
+
+def main(args=sys.argv):
+  locale.setlocale(locale.LC_ALL, '')
+  securities = robin_movavg.crypto_securities
+  begin_cash = float(os.environ['ROBIN_SPEC_CASH']) if 'ROBIN_SPEC_CASH' in os.environ else robin_movavg.BEGIN_CASH
+  strategy = make_strategy(os.environ.get('ROBIN_STRATEGY', 'ma_cross'))
+  ledger = Ledger(mode='sim', quiet=quiet_requested(args))
+
+  timestamps, prices = aligned_history(securities)
+  if len(timestamps) < 2:
+    print('Not enough overlapping history for {}'.format(securities))
+    return
+
+  signals = portfolio_signals(strategy, prices)
+  equity, realized, trades = simulate_portfolio(
+    securities, timestamps, prices, signals, begin_cash, ticks=robin_movavg.SIMULATION_TICKS, ledger=ledger,
+  )
+  end_cash = equity[-1]
+  ledger.record('pnl', 'PORTFOLIO', ts=robin_bars.parse_ts(timestamps[-1]), cash=end_cash, pnl=end_cash - begin_cash, note=repr(strategy))
+  ledger.flush()
+
+  print('{} over {} securities, {} bars ({} to {})'.format(strategy, len(securities), len(equity), timestamps[-len(equity)], timestamps[-1]))
+  for s, sec in enumerate(securities):
+    print('{:<4} trades={:<4} realized={}'.format(sec, trades[s], locale.currency(realized[s])))
+  print('Portfolio {} -> {} ({}% return, {}% max drawdown)'.format(
+    locale.currency(begin_cash), locale.currency(end_cash),
+    round(((end_cash - begin_cash) / begin_cash) * 100.0, 2),
+    round(max_drawdown(equity) * 100.0, 2),
+  ))
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,251 @@
+
+# One process polls quotes, every worker on the host reads them from shared memory.
+#
+# python robin_quotebus.py publish [LTC ETH ...]   # run once per host
+# ROBIN_QUOTE_POLL_SEC=5 # how often the publisher polls each symbol
+#
+# Workers call robin_quotebus.get_crypto_quote(sec) instead of
+# robinhood.crypto.get_crypto_quote(sec); it reads the newest quote straight
+# out of the shared segment and only goes to the API when no publisher is
+# running or its data is stale.
+#
+# Layout of the segment (all little-endian 8 byte fields):
+#   header:  magic, n_symbols, ring_len, publisher pid
+#   symbols: n_symbols * 8 byte ascii names
+#   heads:   n_symbols * newest sequence number
+#   rings:   n_symbols * ring_len * (seq, ts, bid, ask, mark)
+# A slot's seq is set to -1 while it is being written, readers retry if the seq
+# changed under them.
+
+# python -m pip install --user robin_stocks
+from robin_stocks import robinhood
+
+import os
+import sys
+import time
+import random
+import struct
+import signal
+from multiprocessing import shared_memory
+
+SHM_NAME = 'robin_quotes'
+MAGIC = 0x524f42494e51  # 'ROBINQ'
+RING_LEN = 64
+MAX_QUOTE_AGE_SECONDS = 30
+REATTACH_SECONDS = 30
+
+HEADER = struct.Struct('<qqqq')
+SYMBOL = struct.Struct('<8s')
+HEAD = struct.Struct('<q')
+SLOT = struct.Struct('<qdddd')
+
+# Stop this process's resource tracker from unlinking a segment it attached
+# to (but didn't create) when it exits
+def untrack(shm):
+  try:
+    from multiprocessing import resource_tracker
+    resource_tracker.unregister(shm._name, 'shared_memory')
+  except Exception as e:
+    pass
+
+# pid of the publisher that owns the segment if it is still running, else None
+def live_publisher(shm):
+  if shm.size < HEADER.size:
+    return None
+  magic, n, ring_len, pid = HEADER.unpack_from(shm.buf, 0)
+  if magic != MAGIC or pid == os.getpid():
+    return None
+  try:
+    os.kill(pid, 0)
+  except ProcessLookupError:
+    return None
+  except PermissionError:
+    pass
+  return pid
+
+def segment_size(n_symbols, ring_len):
+  return HEADER.size + n_symbols * (SYMBOL.size + HEAD.size + ring_len * SLOT.size)
+
+def offsets(n_symbols, ring_len):
+  symbols_at = HEADER.size
+  heads_at = symbols_at + n_symbols * SYMBOL.size
+  rings_at = heads_at + n_symbols * HEAD.size
+  return symbols_at, heads_at, rings_at
+
+
+class QuotePublisher:
+  def __init__(self, symbols, ring_len=RING_LEN, name=SHM_NAME):
+    self.symbols = list(symbols)
+    self.ring_len = ring_len
+    n = len(self.symbols)
+    try:
+      existing = shared_memory.SharedMemory(name=name)
+    except FileNotFoundError:
+      existing = None
+    if existing is not None:
+      pid = live_publisher(existing)
+      if pid is not None:
+        # Unlinking would cut its readers off, it keeps the segment
+        untrack(existing)
+        existing.close()
+        raise RuntimeError('Quote publisher pid {} is already serving {}'.format(pid, name))
+      # Left behind by a publisher that was killed
+      existing.close()
+      existing.unlink()
+    self.shm = shared_memory.SharedMemory(name=name, create=True, size=segment_size(n, ring_len))
+    self.symbols_at, self.heads_at, self.rings_at = offsets(n, ring_len)
+    buf = self.shm.buf
+    for i, sec in enumerate(self.symbols):
+      SYMBOL.pack_into(buf, self.symbols_at + i * SYMBOL.size, sec.encode('ascii'))
+      HEAD.pack_into(buf, self.heads_at + i * HEAD.size, -1)
+    HEADER.pack_into(buf, 0, MAGIC, n, ring_len, os.getpid())
+    self.seqs = [-1] * n
+
+  def publish(self, sec, bid, ask, mark, ts=None):
+    i = self.symbols.index(sec)
+    seq = self.seqs[i] + 1
+    slot_at = self.rings_at + (i * self.ring_len + seq % self.ring_len) * SLOT.size
+    buf = self.shm.buf
+    SLOT.pack_into(buf, slot_at, -1, 0.0, 0.0, 0.0, 0.0)
+    SLOT.pack_into(buf, slot_at, seq, time.time() if ts is None else ts, bid, ask, mark)
+    HEAD.pack_into(buf, self.heads_at + i * HEAD.size, seq)
+    self.seqs[i] = seq
+
+  def close(self):
+    self.shm.close()
+    self.shm.unlink()
+
+
+class QuoteReader:
+  def __init__(self, name=SHM_NAME):
+    self.shm = shared_memory.SharedMemory(name=name)
+    # Readers must not unlink the publisher's segment when they exit
+    untrack(self.shm)
+    magic, n, self.ring_len, self.publisher_pid = HEADER.unpack_from(self.shm.buf, 0)
+    if magic != MAGIC:
+      self.shm.close()
+      raise ValueError('{} is not a quote bus segment'.format(name))
+    self.symbols_at, self.heads_at, self.rings_at = offsets(n, self.ring_len)
+    self.index = {}
+    for i in range(n):
+      raw = SYMBOL.unpack_from(self.shm.buf, self.symbols_at + i * SYMBOL.size)[0]
+      self.index[raw.rstrip(b'\0').decode('ascii')] = i
+
+  # Newest quote for sec as (seq, ts, bid, ask, mark), or None if not published yet
+  def latest_raw(self, sec):
+    i = self.index.get(sec)
+    if i is None:
+      return None
+    buf = self.shm.buf
+    for attempt in range(8):
+      head = HEAD.unpack_from(buf, self.heads_at + i * HEAD.size)[0]
+      if head < 0:
+        return None
+      slot_at = self.rings_at + (i * self.ring_len + head % self.ring_len) * SLOT.size
+      slot = SLOT.unpack_from(buf, slot_at)
+      if slot[0] == head:
+        return slot
+    return None
+
+  # Same keys robinhood.crypto.get_crypto_quote() gives the callers in this repo
+  def latest(self, sec, max_age=MAX_QUOTE_AGE_SECONDS):
+    slot = self.latest_raw(sec)
+    if slot is None:
+      return None
+    seq, ts, bid, ask, mark = slot
+    if time.time() - ts > max_age:
+      return None
+    return {
+      'symbol': '{}USD'.format(sec),
+      'bid_price': bid,
+      'ask_price': ask,
+      'mark_price': mark,
+      'seq': seq,
+      'ts': ts,
+    }
+
+  def close(self):
+    self.shm.close()
+
+
+reader = None
+last_attach_attempt = 0.0
+
+def attach():
+  global reader
+  global last_attach_attempt
+  if reader is None and time.time() - last_attach_attempt > REATTACH_SECONDS:
+    last_attach_attempt = time.time()
+    try:
+      reader = QuoteReader()
+    except (FileNotFoundError, ValueError) as e:
+      reader = None
+  return reader
+
+# Drop-in for robinhood.crypto.get_crypto_quote(sec)
+def get_crypto_quote(sec):
+  global reader
+  if attach():
+    q = reader.latest(sec)
+    if q is not None:
+      return q
+    if sec in reader.index:
+      # Stale; the publisher may have restarted with a new segment
+      reader.close()
+      reader = None
+  return robinhood.crypto.get_crypto_quote(sec)
+
+
+def publish_forever(symbols, poll_seconds):
+  pub = QuotePublisher(symbols)
+
+  def on_exit(sig, frame):
+    pub.close()
+    sys.exit(0)
+  signal.signal(signal.SIGINT, on_exit)
+  signal.signal(signal.SIGTERM, on_exit)
+
+  print('Publishing {} every {}s to shared memory {}'.format(symbols, poll_seconds, SHM_NAME))
+  while True:
+    begin = time.time()
+    for sec in symbols:
+      try:
+        q = robinhood.crypto.get_crypto_quote(sec)
+        pub.publish(sec, float(q['bid_price']), float(q['ask_price']), float(q['mark_price']))
+      except Exception as e:
+        print('{}: {}'.format(sec, e))
+    time.sleep(max(0.0, poll_seconds - (time.time() - begin)))
+
+
+def main(args=sys.argv):
+  if 'publish' in args:
+    symbols = args[args.index('publish')+1:]
+    if len(symbols) < 1:
+      symbols = ['LTC', 'ETC', 'ETH', 'BCH', 'BSV', 'BTC']
+    poll_seconds = float(os.environ['ROBIN_QUOTE_POLL_SEC']) if 'ROBIN_QUOTE_POLL_SEC' in os.environ else 5.0
+
+    # Ensure generate_device_token always gives
+    # the same machine name.
+    # https://github.com/jmfernandes/robin_stocks/blob/master/robin_stocks/robinhood/authentication.py
+    random.seed(a="123", version=2)
+    login = robinhood.login(
+      'email@example.com',
+      'some-pw-or-token',
+    )
+    random.seed(a=str(time.time()), version=2)
+
+    publish_forever(symbols, poll_seconds)
+
+  else:
+    # Show what workers would currently see
+    r = attach()
+    if not r:
+      print('No quote publisher running (shared memory {})'.format(SHM_NAME))
+      return
+    print('publisher pid={}'.format(r.publisher_pid))
+    for sec in r.index:
+      print('{:<4} {}'.format(sec, r.latest(sec, max_age=float('inf'))))
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,221 @@
+
+# Paper-trade many strategy variants side by side on one live feed.
+#
+# python robin_shadow.py [LTC ETH ...]
+#
+# Every poll reads one quote per security (from the quote bus when a publisher
+# is running, else one API call) and every new 5-minute bar is read once from
+# robin_bars.py; all variants are fed from those, so adding variants only
+# costs CPU. Fills are simulated locally against the live quotes: a resting
+# buy fills once the ask drops to its limit, a resting sell once the bid
+# reaches its limit. Orders, fills and P&L go to the ledger with mode
+# 'shadow' and the variant name as the note.
+#
+# Variants (comma separated lists override the default grids):
+#   bid_ask  - robin.py idle_speculation rules for every
+#              ROBIN_SHADOW_BS_PERCENT x ROBIN_SHADOW_MAX_BID_PERCENT,
+#              buys cancelled after ROBIN_TIMEOUT_SEC
+#   ma_cross - robin_movavg.py intrabar rules for every
+#              ROBIN_SHADOW_SHORT_SLOTS x ROBIN_SHADOW_LONG_SLOTS
+#
+# ROBIN_SHADOW_POLL_SEC=10
+# ROBIN_SHADOW_CASH=50.0 # virtual cash per variant
+
+import os
+import sys
+import time
+import locale
+
+# python -m pip install --user numpy
+import numpy as np
+
+from robin_ledger import Ledger, quiet_requested
+from robin_strategy import make_strategy, BUY, SELL
+import robin_bars
+import robin_quotebus
+import robin_movavg
+
+def env_list(name, default):
+  if name in os.environ:
+    return [float(x) for x in os.environ[name].split(',') if x.strip()]
+  return default
+
+BS_PERCENTS = env_list('ROBIN_SHADOW_BS_PERCENT', [0.003, 0.0051, 0.0075, 0.01])
+MAX_BID_PERCENTS = env_list('ROBIN_SHADOW_MAX_BID_PERCENT', [0.99, 0.995, 0.999])
+SHORT_SLOTS = [int(x) for x in env_list('ROBIN_SHADOW_SHORT_SLOTS', [6, 12, 24])]
+LONG_SLOTS = [int(x) for x in env_list('ROBIN_SHADOW_LONG_SLOTS', [12*3, 12*6, 12*12])]
+
+POLL_SECONDS = float(os.environ['ROBIN_SHADOW_POLL_SEC']) if 'ROBIN_SHADOW_POLL_SEC' in os.environ else 10.0
+BEGIN_CASH = float(os.environ['ROBIN_SHADOW_CASH']) if 'ROBIN_SHADOW_CASH' in os.environ else 50.0
+BUY_TIMEOUT_SECONDS = abs(float(os.environ['ROBIN_TIMEOUT_SEC'])) if 'ROBIN_TIMEOUT_SEC' in os.environ else 22 * 60
+MAX_PRICE_SLOTS = 12*6 # idle_speculation's 6hr high
+BAR_SECONDS = robin_bars.INTERVAL_SECONDS['5minute']
+
+IDLE, BUYING, SELLING = 'idle', 'buying', 'selling'
+
+class Variant:
+  def __init__(self, name, sec, ledger, begin_cash=BEGIN_CASH):
+    self.name = name
+    self.sec = sec
+    self.ledger = ledger
+    self.begin_cash = begin_cash
+    self.cash = begin_cash
+    self.shares = 0.0
+    self.trades = 0
+    self.mark = 0.0
+
+  def record(self, event, side, price, quantity, **fields):
+    self.ledger.record(event, self.sec, side=side, price=price, quantity=quantity,
+      cash=self.cash, shares=self.shares, note=self.name, **fields)
+
+  def buy(self, price):
+    quantity = self.cash / price
+    self.shares += quantity
+    self.cash = 0.0
+    self.record('fill', 'buy', price, quantity)
+
+  def sell(self, price):
+    quantity = self.shares
+    self.cash += quantity * price
+    self.shares = 0.0
+    self.trades += 1
+    self.record('fill', 'sell', price, quantity)
+    self.ledger.record('pnl', self.sec, cash=self.cash, shares=self.shares, pnl=self.pnl(), note=self.name)
+
+  def equity(self):
+    return self.cash + self.shares * self.mark
+
+  def pnl(self):
+    return self.equity() - self.begin_cash
+
+  # Called once per new bar with the bar closes / highs (oldest first)
+  def on_bar(self, closes, highs):
+    pass
+
+  def on_quote(self, now, bid, ask):
+    self.mark = bid
+
+
+# robin.py idle_speculation
+class BidAskVariant(Variant):
+  def __init__(self, sec, ledger, buy_sell_percent, max_bid_percent, timeout_seconds=BUY_TIMEOUT_SECONDS):
+    name = 'bid_ask bs={} max_bid={}'.format(buy_sell_percent, max_bid_percent)
+    super().__init__(name, sec, ledger)
+    self.buy_sell_percent = buy_sell_percent
+    self.max_bid_percent = max_bid_percent
+    self.timeout_seconds = timeout_seconds
+    self.state = IDLE
+    self.limit = 0.0
+    self.placed_at = 0.0
+    self.max_price = None
+
+  def on_bar(self, closes, highs):
+    self.max_price = float(np.max(highs[-MAX_PRICE_SLOTS:]))
+
+  def on_quote(self, now, bid, ask):
+    super().on_quote(now, bid, ask)
+    if self.state == SELLING and bid >= self.limit:
+      self.sell(self.limit)
+      self.state = IDLE
+      return
+
+    if self.state == BUYING:
+      if ask <= self.limit:
+        self.buy(self.limit)
+        self.limit = self.limit * (1.001 + self.buy_sell_percent)
+        self.state = SELLING
+        self.record('order', 'sell', self.limit, self.shares)
+      elif now - self.placed_at >= self.timeout_seconds:
+        self.record('cancel', 'buy', self.limit, self.cash / self.limit, elapsed_s=now - self.placed_at)
+        self.state = IDLE
+      return
+
+    if self.state == IDLE and self.max_price is not None:
+      limit = bid * (1.0 - self.buy_sell_percent)
+      if limit < self.max_bid_percent * self.max_price:
+        self.limit = limit
+        self.placed_at = now
+        self.state = BUYING
+        self.record('order', 'buy', limit, self.cash / limit)
+
+
+# robin_movavg.py main('intrabar'): buys at the ask, sells at the bid
+class MACrossVariant(Variant):
+  def __init__(self, sec, ledger, short_slots, long_slots):
+    super().__init__('ma_cross short={} long={}'.format(short_slots, long_slots), sec, ledger)
+    self.strategy = make_strategy('ma_cross', short_slots=short_slots, long_slots=long_slots)
+    self.indicators = None
+    self.last_buy_price = 0.0
+
+  def on_bar(self, closes, highs):
+    self.indicators = self.strategy.indicators(closes)
+
+  def on_quote(self, now, bid, ask):
+    super().on_quote(now, bid, ask)
+    if self.indicators is None:
+      return
+    if self.cash > 1.00 and self.strategy.decide(ask, self.indicators) == BUY:
+      self.buy(ask)
+      self.last_buy_price = ask
+    elif self.shares > 0.0 and bid > self.last_buy_price and self.strategy.decide(bid, self.indicators) == SELL:
+      self.sell(bid)
+
+
+def make_variants(sec, ledger):
+  variants = []
+  for bs in BS_PERCENTS:
+    for max_bid in MAX_BID_PERCENTS:
+      variants.append(BidAskVariant(sec, ledger, bs, max_bid))
+  for short in SHORT_SLOTS:
+    for long in LONG_SLOTS:
+      if short < long:
+        variants.append(MACrossVariant(sec, ledger, short, long))
+  return variants
+
+def print_table(variants):
+  print('{:<5} {:<34} {:>10} {:>10} {:>7} {:>8}'.format('sec', 'variant', 'equity', 'pnl', 'trades', 'pnl %'))
+  for v in sorted(variants, key=lambda v: v.pnl(), reverse=True):
+    print('{:<5} {:<34} {:>10} {:>10} {:>7} {:>8}'.format(
+      v.sec, v.name, locale.currency(v.equity()), locale.currency(v.pnl()), v.trades,
+      round(v.pnl() / v.begin_cash * 100.0, 2),
+    ))
+
+
+def main(args=sys.argv):
+  locale.setlocale(locale.LC_ALL, '')
+  securities = [a for a in args[1:] if a != 'quiet']
+  if len(securities) < 1:
+    securities = [os.environ['USE_SECURITY']] if 'USE_SECURITY' in os.environ else robin_movavg.crypto_securities
+
+  ledger = Ledger(mode='shadow', quiet=quiet_requested(args))
+  variants = {sec: make_variants(sec, ledger) for sec in securities}
+  print('Shadow trading {} variants on {} every {}s'.format(
+    sum(len(v) for v in variants.values()), securities, POLL_SECONDS))
+
+  next_bar_at = 0.0
+  while True:
+    begin = time.time()
+    if begin >= next_bar_at:
+      # One bar read per security per bar, shared by every variant
+      for sec in securities:
+        bars = robin_movavg.get_crypto_history_bars(sec)
+        closes = np.array([float(b['close_price']) for b in bars])
+        highs = np.array([float(b['high_price']) for b in bars])
+        for v in variants[sec]:
+          v.on_bar(closes, highs)
+      next_bar_at = (begin // BAR_SECONDS + 1) * BAR_SECONDS + 10
+      print_table([v for vs in variants.values() for v in vs])
+      ledger.flush()
+
+    for sec in securities:
+      q = robin_quotebus.get_crypto_quote(sec)
+      bid, ask = float(q['bid_price']), float(q['ask_price'])
+      now = time.time()
+      for v in variants[sec]:
+        v.on_quote(now, bid, ask)
+
+    time.sleep(max(0.0, POLL_SECONDS - (time.time() - begin)))
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,97 @@
+
+# Pluggable trading strategies evaluated over a whole price history at once.
+#
+# A strategy is a pair of functions:
+#   indicators(history, **params) -> {'name': array aligned with history, ...}
+#   rule(price, **indicators) -> array of signal codes (HOLD/BUY/SELL)
+# Both operate on numpy arrays, so a full backtest is one vectorized call and
+# the live loop evaluates the exact same rule on the newest element. Passing a
+# 2d history (one row per price path) evaluates every row at once.
+#
+# ROBIN_STRATEGY=ma_cross # which registered strategy robin_movavg.py uses
+
+# python -m pip install --user numpy
+import numpy as np
+
+HOLD = 0
+BUY = 1
+SELL = 2
+
+SIGNAL_NAMES = {
+  HOLD: 'hold',
+  BUY: 'buy',
+  SELL: 'sell',
+}
+
+# Mean of history[i-slots+1 .. i] at every index i, nan until `slots` values exist.
+# Matches robin_movavg.moving_avg() when both are indexed from the end.
+# A 2d history is treated as one price series per row.
+def rolling_mean(history, slots):
+  history = np.asarray(history, dtype=np.float64)
+  out = np.full(history.shape, np.nan)
+  if history.shape[-1] >= slots:
+    zeros = np.zeros(history.shape[:-1] + (1,))
+    c = np.cumsum(np.concatenate((zeros, history), axis=-1), axis=-1)
+    out[..., slots-1:] = (c[..., slots:] - c[..., :-slots]) / slots
+  return out
+
+
+class Strategy:
+  def __init__(self, name, indicators, rule, **params):
+    self.name = name
+    self._indicators = indicators
+    self.rule = rule
+    self.params = params
+
+  def indicators(self, history):
+    return self._indicators(np.asarray(history, dtype=np.float64), **self.params)
+
+  # Signal code for every element of history
+  def signals(self, history, indicators=None):
+    history = np.asarray(history, dtype=np.float64)
+    if indicators is None:
+      indicators = self.indicators(history)
+    return self.rule(history, **indicators)
+
+  # Signal code for one price (eg a live quote) against the newest indicator values
+  def decide(self, price, indicators):
+    latest = {k: v[-1:] for k, v in indicators.items()}
+    return int(self.rule(np.asarray([price], dtype=np.float64), **latest)[0])
+
+  def describe(self, price, indicators, i=-1):
+    return 'now:{} {}'.format(price, ' '.join(
+      '{}:{}'.format(k, round(float(v[i]), 4)) for k, v in indicators.items()
+    ))
+
+  def __repr__(self):
+    return '{}({})'.format(self.name, ', '.join('{}={}'.format(k, v) for k, v in sorted(self.params.items())))
+
+
+STRATEGIES = {}
+
+def register(name, indicators, rule, **default_params):
+  STRATEGIES[name] = (indicators, rule, default_params)
+
+def make_strategy(name='ma_cross', **params):
+  if not name in STRATEGIES:
+    raise ValueError('Unknown strategy {}, expected one of {}'.format(name, sorted(STRATEGIES)))
+  indicators, rule, default_params = STRATEGIES[name]
+  merged = dict(default_params)
+  merged.update(params)
+  return Strategy(name, indicators, rule, **merged)
+
+
+# Buy when the price dips below the short moving average,
+# sell when it climbs above the long moving average.
+# 12 slots = 1hr, 72 slots = 6hr of 5-minute bars.
+def ma_cross_indicators(history, short_slots=12, long_slots=12*6):
+  return {
+    'short': rolling_mean(history, short_slots),
+    'long': rolling_mean(history, long_slots),
+  }
+
+def ma_cross_rule(price, short, long):
+  # nan comparisons are False, so ticks without a full window hold
+  return np.where(price < short, BUY, np.where(price > long, SELL, HOLD)).astype(np.int8)
+
+register('ma_cross', ma_cross_indicators, ma_cross_rule, short_slots=12, long_slots=12*6)
@@ -0,0 +1,172 @@
+
+# Lifecycle trace of every order the bot places, from the quote the decision
+# was made on to the fill (or cancel), for tuning ROBIN_BS_PERCENT, poll
+# intervals and timeouts.
+#
+# python robin_trace.py [path] [SEC ...]   # per security + side percentiles
+#
+#   trace = robin_trace.OrderTrace('LTC', 'buy', bid=q_bid, ask=q_ask)
+#   trace.submit()                 # before every order API call
+#   trace.retry('increment')       # the call was rejected and will be retried
+#   trace.submitted(order_id, price, quantity)
+#   trace.state(order_state)       # after every poll
+#   trace.finish('filled', fill_price, fill_quantity)
+#
+# Finished traces are appended to ROBIN_TRACE as one JSON object per line
+# from robin_dispatch's thread. State transitions are only seen when the
+# order is polled, so their timestamps are accurate to the poll interval.
+#
+# ROBIN_TRACE=/tmp/.robin_traces.jsonl
+
+import os
+import sys
+import json
+import time
+
+import robin_dispatch
+
+DEFAULT_TRACE_PATH = '/tmp/.robin_traces.jsonl'
+
+def trace_path():
+  return os.environ.get('ROBIN_TRACE', DEFAULT_TRACE_PATH)
+
+def append(records, path=None):
+  with open(path or trace_path(), 'a') as fd:
+    fd.write(''.join(json.dumps(r) + '\n' for r in records))
+
+class OrderTrace:
+  def __init__(self, sec, side, bid=None, ask=None, note=''):
+    self.decision_ts = time.time()
+    self.rec = {
+      'sec': sec,
+      'side': side,
+      'pid': os.getpid(),
+      'note': note,
+      'decision_ts': self.decision_ts,
+      'decision_bid': bid,
+      'decision_ask': ask,
+      'order_id': None,
+      'limit_price': None,
+      'quantity': None,
+      'submit_attempts': 0,
+      'retries': {},
+      'transitions': [],   # [state, seconds since decision]
+      'submit_s': None,    # decision -> first order API call
+      'ack_s': None,       # first order API call -> order id returned
+      'fill_s': None,      # order id returned -> fill observed
+      'outcome': None,
+      'fill_price': None,
+      'fill_quantity': None,
+      'slippage': None,    # fill vs the decision quote, positive = worse
+    }
+    self.first_submit_ts = None
+    self.submitted_ts = None
+    self.last_state = None
+
+  def submit(self):
+    if self.first_submit_ts is None:
+      self.first_submit_ts = time.time()
+      self.rec['submit_s'] = self.first_submit_ts - self.decision_ts
+    self.rec['submit_attempts'] += 1
+
+  def retry(self, reason):
+    self.rec['retries'][reason] = self.rec['retries'].get(reason, 0) + 1
+
+  def submitted(self, order_id, price, quantity):
+    self.submitted_ts = time.time()
+    self.rec['order_id'] = order_id
+    self.rec['limit_price'] = float(price)
+    self.rec['quantity'] = float(quantity)
+    if self.first_submit_ts is not None:
+      self.rec['ack_s'] = self.submitted_ts - self.first_submit_ts
+    self.state('submitted')
+
+  def state(self, state):
+    if state != self.last_state:
+      self.last_state = state
+      self.rec['transitions'].append([state, round(time.time() - self.decision_ts, 3)])
+
+  # outcome: 'filled', 'canceled', 'replaced', ...
+  def finish(self, outcome, price=None, quantity=None):
+    rec = self.rec
+    if rec['outcome'] is not None:
+      return rec
+    self.state(outcome)
+    rec['outcome'] = outcome
+    if outcome == 'filled' and price is not None:
+      rec['fill_price'] = float(price)
+      rec['fill_quantity'] = float(quantity) if quantity is not None else rec['quantity']
+      if self.submitted_ts is not None:
+        rec['fill_s'] = time.time() - self.submitted_ts
+      # Buys are compared with the ask they could have taken, sells with the bid
+      reference = rec['decision_ask'] if rec['side'] == 'buy' else rec['decision_bid']
+      if reference:
+        reference = float(reference)
+        sign = 1.0 if rec['side'] == 'buy' else -1.0
+        rec['slippage'] = sign * (rec['fill_price'] - reference) / reference
+    robin_dispatch.call(append, [rec])
+    return rec
+
+
+def read_traces(path):
+  traces = []
+  with open(path, 'r') as fd:
+    for line in fd:
+      if line.strip():
+        traces.append(json.loads(line))
+  return traces
+
+# Nearest-rank percentile of a non-empty list
+def percentile(values, p):
+  values = sorted(values)
+  return values[min(len(values) - 1, int(len(values) * p / 100.0))]
+
+# {(sec, side): {'orders', 'outcomes', 'retries', 'ack_s', 'fill_s', 'slippage_bps'}}
+# where the last three are (p50, p90, p99) or None without data
+def summarize(traces):
+  groups = {}
+  for t in traces:
+    groups.setdefault((t['sec'], t['side']), []).append(t)
+
+  summary = {}
+  for key, ts in groups.items():
+    outcomes = {}
+    for t in ts:
+      outcomes[t['outcome']] = outcomes.get(t['outcome'], 0) + 1
+    s = {
+      'orders': len(ts),
+      'outcomes': outcomes,
+      'retries': sum(sum(t['retries'].values()) for t in ts) / float(len(ts)),
+    }
+    for field, scale, out in (('ack_s', 1.0, 'ack_s'), ('fill_s', 1.0, 'fill_s'), ('slippage', 10000.0, 'slippage_bps')):
+      values = [t[field] * scale for t in ts if t.get(field) is not None]
+      s[out] = tuple(percentile(values, p) for p in (50, 90, 99)) if values else None
+    summary[key] = s
+  return summary
+
+def print_summary(summary):
+  def fmt(pcts, digits):
+    return '-' if pcts is None else '/'.join(str(round(x, digits)) for x in pcts)
+  print('{:<5} {:<4} {:>6} {:>8} {:<24} {:<20} {:<20} {:<20}'.format(
+    'sec', 'side', 'orders', 'retries', 'outcomes', 'ack s p50/90/99', 'fill s p50/90/99', 'slip bps p50/90/99'))
+  for (sec, side), s in sorted(summary.items()):
+    outcomes = ' '.join('{}={}'.format(k, v) for k, v in sorted(s['outcomes'].items()))
+    print('{:<5} {:<4} {:>6} {:>8} {:<24} {:<20} {:<20} {:<20}'.format(
+      sec, side, s['orders'], round(s['retries'], 2), outcomes,
+      fmt(s['ack_s'], 3), fmt(s['fill_s'], 1), fmt(s['slippage_bps'], 1),
+    ))
+
+
+def main(args=sys.argv):
+  paths = [a for a in args[1:] if os.path.sep in a or a.endswith('.jsonl')]
+  secs = [a for a in args[1:] if not a in paths]
+  path = paths[0] if paths else trace_path()
+  if not os.path.exists(path):
+    print('No traces at {}'.format(path))
+    return
+  traces = [t for t in read_traces(path) if not secs or t['sec'] in secs]
+  print_summary(summarize(traces))
+
+
+if __name__ == '__main__':
+  main()